@@ -1,36 +1,181 @@
 #!/usr/bin/env python3
 """
 数据库迁移脚本 - 添加每日提交统计表
-为现有的factors.db数据库添加daily_submit_stats表及相关视图
+为现有的factors.db数据库添加daily_submit_stats表及相关视图（表结构定义见 daily_submit_stats.sql），
+旧结构的表重建为当前结构
 """
 
 import os
 import sys
 import sqlite3
+import contextlib
+import io
 from datetime import datetime
 
-# 添加src目录到路径
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-from config import ROOT_PATH
+# 项目根目录（与 src/config.py 的 ROOT_PATH 一致），直接计算以免为一个常量导入整个config模块
+ROOT_PATH = os.environ.get('PROJECT_ROOT') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
-def check_table_exists(cursor, table_name):
+# system_config 中记录迁移完成时 schema_version 的配置键
+MIGRATION_VERSION_KEY = 'daily_submit_stats_schema_version'
+
+# 重复执行的语句固定为模块级常量：sqlite3 按SQL文本在连接上缓存已编译语句（LRU），
+# 文本完全一致即可复用预编译结果，无需重复解析
+SCHEMA_VERSION_SQL = "PRAGMA schema_version"
+GET_CONFIG_SQL = "SELECT config_value FROM system_config WHERE config_key = ?"
+SET_CONFIG_SQL = """
+    INSERT OR REPLACE INTO system_config (config_key, config_value, description, updated_at)
+    VALUES (?, ?, ?, datetime('now'))
+"""
+
+# daily_submit_stats 表、缓存表、触发器及视图的唯一定义（新建数据库时由 FactorDatabaseManager 在 schema.sql 之后执行）
+DAILY_SUBMIT_STATS_SQL_PATH = os.path.join(ROOT_PATH, 'database', 'daily_submit_stats.sql')
+
+# 重建旧结构时每条多行INSERT包含的行数（5列×500行，远低于SQLite的绑定参数上限）
+RESTORE_BATCH_SIZE = 500
+RESTORE_VALUES_ROW = "(?, ?, ?, ?, ?)"
+RESTORE_INSERT_SQL = """
+    INSERT INTO daily_submit_stats 
+    (date, successful_submits, total_attempts, timezone, last_updated)
+    VALUES {values}
+"""
+
+def load_daily_submit_stats_sql():
+    """读取 daily_submit_stats.sql"""
+    with open(DAILY_SUBMIT_STATS_SQL_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def table_exists(cursor, table_name):
     """检查表是否存在"""
-    cursor.execute("""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name=?
-    """, (table_name,))
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
     return cursor.fetchone() is not None
 
-def check_view_exists(cursor, view_name):
-    """检查视图是否存在"""
-    cursor.execute("""
-        SELECT name FROM sqlite_master 
-        WHERE type='view' AND name=?
-    """, (view_name,))
+def is_current_layout(cursor):
+    """daily_submit_stats 是否已是 daily_submit_stats.sql 中的结构
+
+    只有该结构以 (date, timezone) 为 WITHOUT ROWID 主键（索引来源为 'pk'）；
+    旧结构（id 自增主键 + date UNIQUE 或 UNIQUE(date, timezone)）均需重建
+    """
+    cursor.execute("SELECT 1 FROM pragma_index_list('daily_submit_stats') WHERE origin = 'pk'")
     return cursor.fetchone() is not None
 
-def main():
-    """主函数"""
+def install_daily_submit_stats(cursor):
+    """开启事务并执行 daily_submit_stats.sql（不提交，后续步骤仍处于同一事务中）"""
+    # 脚本以 BEGIN IMMEDIATE 开头且不含 COMMIT；CREATE ... IF NOT EXISTS 在引擎内完成存在性判断
+    cursor.executescript("BEGIN IMMEDIATE;\n" + load_daily_submit_stats_sql())
+
+def rebuild_daily_submit_stats(cursor):
+    """将旧结构的 daily_submit_stats 重建为当前结构（开启事务且不提交）
+
+    旧表改名保留，按 daily_submit_stats.sql 建好新表后，把旧数据按 (date, timezone) 合并写入，再删除旧表。
+    返回 (恢复的记录数, 合并掉的重复记录数)
+    """
+    # 改名时不重写、不校验引用该表的视图和触发器：旧的 daily_submit_overview 视图随后由脚本重建，
+    # 库中其他视图的错误也不会使改名失败
+    cursor.execute("PRAGMA legacy_alter_table = ON")
+    cursor.executescript(
+        "BEGIN IMMEDIATE;\n"
+        "ALTER TABLE daily_submit_stats RENAME TO daily_submit_stats_old;\n"
+        + load_daily_submit_stats_sql()
+    )
+    cursor.execute("PRAGMA legacy_alter_table = OFF")
+    conn = cursor.connection
+    
+    # 在SQLite中分组聚合完成合并：提交数与尝试数累加，更新时间取最大值；按主键顺序写入新表
+    cursor.execute("""
+        SELECT date, SUM(successful_submits), SUM(total_attempts), 
+               timezone, MAX(last_updated), COUNT(*)
+        FROM daily_submit_stats_old
+        GROUP BY date, timezone
+        ORDER BY date, timezone
+    """)
+    
+    # 逐行迭代聚合结果，攒满一批即用多行VALUES插入，每批只编译一条语句；
+    # 事务内的脏页全部保留在页缓存中，提交前不溢出写盘
+    conn.execute("PRAGMA cache_spill = OFF")
+    duplicates_found = 0
+    restored_count = 0
+    batch = []
+    
+    def flush_batch():
+        conn.execute(
+            RESTORE_INSERT_SQL.format(values=", ".join([RESTORE_VALUES_ROW] * len(batch))),
+            [value for row in batch for value in row]
+        )
+    
+    for *row, group_size in cursor:
+        if group_size > 1:
+            duplicates_found += group_size - 1
+            print(f"⚠️  发现重复记录: {row[0]} {row[3]} - 将合并 {group_size} 条数据")
+        batch.append(row)
+        if len(batch) >= RESTORE_BATCH_SIZE:
+            flush_batch()
+            restored_count += len(batch)
+            batch.clear()
+    if batch:
+        flush_batch()
+        restored_count += len(batch)
+    
+    # 旧表上的索引和触发器随表一起删除（新表的触发器已由脚本装回）
+    cursor.execute("DROP TABLE daily_submit_stats_old")
+    # 按重建后的数据校正 system_overview 计数，与新表在同一事务中提交
+    cursor.execute("""
+        INSERT OR REPLACE INTO system_overview_cache (table_name, record_count, latest_update)
+        SELECT 'daily_submit_stats', COUNT(*), MAX(last_updated) FROM daily_submit_stats
+    """)
+    return restored_count, duplicates_found
+
+def apply_migration(cursor, backfill=None):
+    """创建（或将旧结构重建为）daily_submit_stats 表，以及缓存表、触发器和视图"""
+    if table_exists(cursor, 'daily_submit_stats') and not is_current_layout(cursor):
+        print("📝 daily_submit_stats 为旧结构，重建为当前结构...")
+        restored_count, duplicates_found = rebuild_daily_submit_stats(cursor)
+        if duplicates_found > 0:
+            print(f"📊 合并了 {duplicates_found} 个重复记录")
+        print(f"✅ 表结构已重建，恢复了 {restored_count} 条记录")
+    else:
+        print("📝 创建daily_submit_stats表、缓存表、触发器及视图...")
+        install_daily_submit_stats(cursor)
+    print("✅ daily_submit_stats表及daily_submit_overview/system_overview缓存已就绪")
+
+    # 表为 (date, timezone) 聚簇主键，按日期读取无需额外索引；回填数据直接按主键写入
+    if backfill is not None:
+        print("📝 回填历史数据...")
+        backfill(cursor)
+        print("✅ 历史数据回填完成")
+
+    # 更新统计信息，让查询规划器对新表/索引有准确的行数和选择性估计（不做VACUUM）
+    print("📝 更新查询规划统计信息...")
+    cursor.execute("ANALYZE daily_submit_stats")
+    cursor.execute("PRAGMA optimize")
+    print("✅ 统计信息已更新")
+
+def get_schema_version(cursor):
+    """读取当前数据库的schema_version"""
+    return cursor.execute(SCHEMA_VERSION_SQL).fetchone()[0]
+
+def get_migrated_schema_version(cursor):
+    """读取上次迁移完成时记录的schema_version"""
+    try:
+        cursor.execute(GET_CONFIG_SQL, (MIGRATION_VERSION_KEY,))
+    except sqlite3.OperationalError:
+        return None
+    result = cursor.fetchone()
+    return int(result[0]) if result else None
+
+def record_migrated_schema_version(cursor):
+    """记录迁移完成后的schema_version，供下次运行时快速判断（缺少system_config表时跳过记录，不影响迁移本身）"""
+    schema_version = get_schema_version(cursor)
+    try:
+        cursor.execute(SET_CONFIG_SQL, (MIGRATION_VERSION_KEY, str(schema_version), '每日提交统计迁移完成时的schema_version'))
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  未记录迁移版本（{e}），下次运行将重新执行迁移")
+
+def run_migration(backfill=None):
+    """
+    执行迁移并输出进度信息
+    
+    :param backfill: 可选的数据回填回调 backfill(cursor)，在建表后、同一事务中执行
+    """
     print("🚀 每日提交统计表迁移脚本")
     print("="*50)
     
@@ -45,134 +190,53 @@ def main():
     print(f"📂 数据库路径: {db_path}")
     
     try:
-        # 连接数据库
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print("✅ 数据库连接成功")
-        
-        # 检查是否已经存在daily_submit_stats表
-        if check_table_exists(cursor, 'daily_submit_stats'):
-            print("ℹ️  daily_submit_stats表已存在，跳过创建")
-        else:
-            print("📝 创建daily_submit_stats表...")
-            cursor.execute("""
-                CREATE TABLE daily_submit_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date DATE NOT NULL UNIQUE,                    -- 日期 YYYY-MM-DD
-                    successful_submits INTEGER DEFAULT 0,         -- 当日成功提交数量
-                    total_attempts INTEGER DEFAULT 0,             -- 当日总尝试数量
-                    timezone VARCHAR(20) DEFAULT 'UTC',           -- 使用的时区
-                    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    
-                    -- 约束检查
-                    CHECK (successful_submits >= 0),
-                    CHECK (total_attempts >= successful_submits)
-                )
-            """)
-            print("✅ daily_submit_stats表创建成功")
-        
-        # 检查索引是否存在
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='index' AND name='idx_daily_submit_stats_date'
-        """)
-        if cursor.fetchone() is None:
-            print("📝 创建日期索引...")
-            cursor.execute("""
-                CREATE INDEX idx_daily_submit_stats_date ON daily_submit_stats(date)
-            """)
-            print("✅ 日期索引创建成功")
-        else:
-            print("ℹ️  日期索引已存在，跳过创建")
-        
-        # 检查是否已经存在daily_submit_overview视图
-        if check_view_exists(cursor, 'daily_submit_overview'):
-            print("ℹ️  daily_submit_overview视图已存在，跳过创建")
-        else:
-            print("📝 创建daily_submit_overview视图...")
-            cursor.execute("""
-                CREATE VIEW daily_submit_overview AS
-                SELECT 
-                    date,
-                    successful_submits,
-                    total_attempts,
-                    timezone,
-                    CASE 
-                        WHEN total_attempts > 0 THEN ROUND(successful_submits * 100.0 / total_attempts, 1)
-                        ELSE 0
-                    END as success_rate,
-                    last_updated
-                FROM daily_submit_stats
-                ORDER BY date DESC
-            """)
-            print("✅ daily_submit_overview视图创建成功")
-        
-        # 更新system_overview视图
-        if check_view_exists(cursor, 'system_overview'):
-            print("📝 更新system_overview视图...")
-            cursor.execute("DROP VIEW system_overview")
-            cursor.execute("""
-                CREATE VIEW system_overview AS
-                SELECT 
-                    'factor_expressions' as table_name,
-                    COUNT(*) as record_count,
-                    MAX(created_at) as latest_update
-                FROM factor_expressions
-                UNION ALL
-                SELECT 
-                    'checked_alphas' as table_name,
-                    COUNT(*) as record_count,
-                    MAX(checked_at) as latest_update
-                FROM checked_alphas
-                UNION ALL
-                SELECT 
-                    'submitable_alphas' as table_name,
-                    COUNT(*) as record_count,
-                    MAX(created_at) as latest_update
-                FROM submitable_alphas
-                UNION ALL
-                SELECT 
-                    'daily_submit_stats' as table_name,
-                    COUNT(*) as record_count,
-                    MAX(last_updated) as latest_update
-                FROM daily_submit_stats
-            """)
-            print("✅ system_overview视图更新成功")
-        
-        # 提交更改
-        conn.commit()
-        
-        # 验证迁移结果
-        print("\n🔍 迁移结果验证:")
-        
-        # 检查表结构
-        cursor.execute("PRAGMA table_info(daily_submit_stats)")
-        columns = cursor.fetchall()
-        print(f"  - daily_submit_stats表有 {len(columns)} 个字段")
-        
-        # 检查数据
-        cursor.execute("SELECT COUNT(*) FROM daily_submit_stats")
-        count = cursor.fetchone()[0]
-        print(f"  - daily_submit_stats表有 {count} 条记录")
-        
-        # 测试视图
-        try:
-            cursor.execute("SELECT * FROM daily_submit_overview LIMIT 1")
-            print("  - daily_submit_overview视图工作正常")
-        except Exception as e:
-            print(f"  - ⚠️  daily_submit_overview视图测试失败: {e}")
-        
-        try:
-            cursor.execute("SELECT * FROM system_overview WHERE table_name='daily_submit_stats'")
-            result = cursor.fetchone()
-            if result:
-                print("  - system_overview视图包含daily_submit_stats")
-            else:
-                print("  - ⚠️  system_overview视图未包含daily_submit_stats")
-        except Exception as e:
-            print(f"  - ⚠️  system_overview视图测试失败: {e}")
+        # 连接数据库（自动提交模式，由下方显式事务统一管理）；closing 保证连接最终关闭
+        with contextlib.closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
+            cursor = conn.cursor()
+            
+            print("✅ 数据库连接成功")
+
+            # WAL模式 + NORMAL同步级别，减少日志落盘开销（必须在事务外设置）
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            # 内存映射I/O（256MB），验证阶段的扫描直接读取映射页，减少read()系统调用
+            cursor.execute("PRAGMA mmap_size=268435456")
+
+            # 所有DDL放在同一个事务中（由迁移脚本开启），只需一次落盘；with conn 成功时提交，异常时回滚
+            with conn:
+                # 已迁移过且结构未变化时直接跳过DDL，避免重复解析sqlite_master
+                schema_version = get_schema_version(cursor)
+                if backfill is None and get_migrated_schema_version(cursor) == schema_version:
+                    print(f"ℹ️  数据库结构已是最新 (schema_version={schema_version})，跳过迁移")
+                else:
+                    apply_migration(cursor, backfill)
+                    record_migrated_schema_version(cursor)
+            
+            # 验证迁移结果
+            print("\n🔍 迁移结果验证:")
+            
+            # 一次查询取回全部校验项（字段数、记录数、两个视图可用性）
+            try:
+                cursor.execute("""
+                    SELECT 
+                        (SELECT COUNT(*) FROM pragma_table_info('daily_submit_stats')),
+                        (SELECT COUNT(*) FROM daily_submit_stats),
+                        EXISTS(SELECT 1 FROM daily_submit_overview LIMIT 1),
+                        EXISTS(SELECT 1 FROM system_overview WHERE table_name='daily_submit_stats')
+                """)
+                column_count, count, _, has_daily_overview = cursor.fetchone()
+                print(f"  - daily_submit_stats表有 {column_count} 个字段")
+                print(f"  - daily_submit_stats表有 {count} 条记录")
+                print("  - daily_submit_overview视图工作正常")
+                if has_daily_overview:
+                    print("  - system_overview视图包含daily_submit_stats")
+                else:
+                    print("  - ⚠️  system_overview视图未包含daily_submit_stats")
+            except Exception as e:
+                print(f"  - ⚠️  视图测试失败: {e}")
         
+        print("📝 数据库连接已关闭")
         print(f"\n🎉 迁移完成!")
         print(f"💡 现在可以使用以下命令查看每日提交限额状态:")
         print(f"   ./control.sh db-daily-limit")
@@ -183,13 +247,18 @@ def main():
     except Exception as e:
         print(f"❌ 迁移失败: {e}")
         import traceback
-        traceback.print_exc()
+        traceback.print_exc(file=sys.stdout)
         return False
-        
+
+def main(backfill=None):
+    """主函数：进度信息先写入缓冲区，结束时一次性输出，避免逐行write/flush"""
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            return run_migration(backfill)
     finally:
-        if 'conn' in locals():
-            conn.close()
-            print("📝 数据库连接已关闭")
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
 
 if __name__ == "__main__":
     success = main()
@@ -0,0 +1,259 @@
+-- ====================================================================
+-- 每日提交统计表 daily_submit_stats 及 daily_submit_overview / system_overview 缓存
+-- ====================================================================
+-- daily_submit_stats 表结构的唯一定义：新建数据库时在 schema.sql 之后执行；
+-- 已有数据库由 add_daily_submit_stats.py（或 upgrade_schema.py）安装，旧结构的表由其重建为本结构。
+-- 所有语句均可重复执行。
+
+-- (date, timezone) 作为自然主键，WITHOUT ROWID 省去rowid B树和额外的唯一索引
+-- date/last_updated 保持ISO-8601文本：调用方均以 'YYYY-MM-DD' 字符串读写并与 date('now', ...) 比较，
+-- 该格式的字典序即时间序，排序和比较无需转换
+CREATE TABLE IF NOT EXISTS daily_submit_stats (
+    date DATE NOT NULL,                           -- 日期 YYYY-MM-DD
+    successful_submits INTEGER DEFAULT 0,         -- 当日成功提交数量
+    total_attempts INTEGER DEFAULT 0,             -- 当日总尝试数量
+    timezone VARCHAR(20) DEFAULT 'UTC',           -- 使用的时区
+    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+    -- 当日失败数量（虚拟生成列），其非负约束等价于 total_attempts >= successful_submits
+    failed_attempts INTEGER GENERATED ALWAYS AS (total_attempts - successful_submits) VIRTUAL
+        CHECK (failed_attempts >= 0),
+
+    -- 约束检查
+    CHECK (successful_submits >= 0),
+
+    PRIMARY KEY (date, timezone)
+) WITHOUT ROWID;
+
+-- 本表上的触发器均先删除再创建：表被重建时，挂在旧表上的同名触发器会随旧表删除，
+-- 重新执行本脚本即可装回到新表上
+
+-- 计数变化时由触发器刷新 last_updated，写入方无需在UPDATE中携带该列
+DROP TRIGGER IF EXISTS trg_daily_submit_stats_touch;
+CREATE TRIGGER trg_daily_submit_stats_touch
+AFTER UPDATE OF successful_submits, total_attempts ON daily_submit_stats
+BEGIN
+    UPDATE daily_submit_stats SET last_updated = CURRENT_TIMESTAMP
+    WHERE date = NEW.date AND timezone = NEW.timezone;
+END;
+
+-- daily_submit_overview 物化为缓存表，由触发器维护，查询时不再重复计算成功率和排序
+-- 缓存表以(date, timezone)为聚簇主键，按date倒序读取时为单次反向扫描，无排序、无回表
+CREATE TABLE IF NOT EXISTS daily_submit_overview_cache (
+    date DATE NOT NULL,
+    successful_submits INTEGER,
+    total_attempts INTEGER,
+    timezone VARCHAR(20),
+    failed_attempts INTEGER,
+    success_rate REAL,
+    last_updated DATETIME,
+    PRIMARY KEY (date, timezone)
+) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS trg_daily_submit_overview_insert;
+CREATE TRIGGER trg_daily_submit_overview_insert
+AFTER INSERT ON daily_submit_stats
+BEGIN
+    INSERT OR REPLACE INTO daily_submit_overview_cache
+    (date, successful_submits, total_attempts, failed_attempts, timezone, success_rate, last_updated)
+    VALUES (
+        NEW.date, NEW.successful_submits, NEW.total_attempts,
+        NEW.total_attempts - NEW.successful_submits, NEW.timezone,
+        CASE
+            WHEN NEW.total_attempts > 0 THEN ROUND(NEW.successful_submits * 100.0 / NEW.total_attempts, 1)
+            ELSE 0
+        END,
+        NEW.last_updated
+    );
+END;
+
+DROP TRIGGER IF EXISTS trg_daily_submit_overview_update;
+CREATE TRIGGER trg_daily_submit_overview_update
+AFTER UPDATE ON daily_submit_stats
+BEGIN
+    DELETE FROM daily_submit_overview_cache
+    WHERE date = OLD.date AND timezone = OLD.timezone;
+    INSERT OR REPLACE INTO daily_submit_overview_cache
+    (date, successful_submits, total_attempts, failed_attempts, timezone, success_rate, last_updated)
+    VALUES (
+        NEW.date, NEW.successful_submits, NEW.total_attempts,
+        NEW.total_attempts - NEW.successful_submits, NEW.timezone,
+        CASE
+            WHEN NEW.total_attempts > 0 THEN ROUND(NEW.successful_submits * 100.0 / NEW.total_attempts, 1)
+            ELSE 0
+        END,
+        NEW.last_updated
+    );
+END;
+
+DROP TRIGGER IF EXISTS trg_daily_submit_overview_delete;
+CREATE TRIGGER trg_daily_submit_overview_delete
+AFTER DELETE ON daily_submit_stats
+BEGIN
+    DELETE FROM daily_submit_overview_cache
+    WHERE date = OLD.date AND timezone = OLD.timezone;
+END;
+
+-- 按现有数据重建缓存（重复运行时同时起到校正作用，清除已不存在的日期）
+DELETE FROM daily_submit_overview_cache;
+INSERT INTO daily_submit_overview_cache
+(date, successful_submits, total_attempts, failed_attempts, timezone, success_rate, last_updated)
+SELECT
+    date,
+    successful_submits,
+    total_attempts,
+    total_attempts - successful_submits,
+    timezone,
+    CASE
+        WHEN total_attempts > 0 THEN ROUND(successful_submits * 100.0 / total_attempts, 1)
+        ELSE 0
+    END,
+    last_updated
+FROM daily_submit_stats;
+
+-- 保留同名视图以兼容现有查询
+DROP VIEW IF EXISTS daily_submit_overview;
+CREATE VIEW daily_submit_overview AS
+SELECT date, successful_submits, total_attempts, failed_attempts, timezone, success_rate, last_updated
+FROM daily_submit_overview_cache
+ORDER BY date DESC;
+
+-- ====================================================================
+-- system_overview 改为读取预聚合表，避免每次查询全表扫描四张表
+-- ====================================================================
+-- 各表的写入均为 INSERT / UPSERT（不使用 INSERT OR REPLACE），计数按行增减即可保持准确。
+-- 触发器先删除再创建：daily_submit_stats 被重建时，挂在旧表上的同名触发器会随旧表删除，
+-- 重新执行本脚本即可装回；计数随后按当前数据重新初始化
+CREATE TABLE IF NOT EXISTS system_overview_cache (
+    table_name TEXT PRIMARY KEY,
+    record_count INTEGER NOT NULL,
+    latest_update DATETIME
+);
+
+-- factor_expressions
+DROP TRIGGER IF EXISTS trg_system_overview_factor_expressions_insert;
+CREATE TRIGGER trg_system_overview_factor_expressions_insert
+AFTER INSERT ON factor_expressions
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count + 1, latest_update = COALESCE(MAX(latest_update, NEW.created_at), NEW.created_at, latest_update)
+    WHERE table_name = 'factor_expressions';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_factor_expressions_update;
+CREATE TRIGGER trg_system_overview_factor_expressions_update
+AFTER UPDATE ON factor_expressions
+BEGIN
+    UPDATE system_overview_cache
+    SET latest_update = COALESCE(MAX(latest_update, NEW.created_at), NEW.created_at, latest_update)
+    WHERE table_name = 'factor_expressions';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_factor_expressions_delete;
+CREATE TRIGGER trg_system_overview_factor_expressions_delete
+AFTER DELETE ON factor_expressions
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count - 1
+    WHERE table_name = 'factor_expressions';
+END;
+
+INSERT OR REPLACE INTO system_overview_cache (table_name, record_count, latest_update)
+SELECT 'factor_expressions', COUNT(*), MAX(created_at) FROM factor_expressions;
+
+-- checked_alphas
+DROP TRIGGER IF EXISTS trg_system_overview_checked_alphas_insert;
+CREATE TRIGGER trg_system_overview_checked_alphas_insert
+AFTER INSERT ON checked_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count + 1, latest_update = COALESCE(MAX(latest_update, NEW.checked_at), NEW.checked_at, latest_update)
+    WHERE table_name = 'checked_alphas';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_checked_alphas_update;
+CREATE TRIGGER trg_system_overview_checked_alphas_update
+AFTER UPDATE ON checked_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET latest_update = COALESCE(MAX(latest_update, NEW.checked_at), NEW.checked_at, latest_update)
+    WHERE table_name = 'checked_alphas';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_checked_alphas_delete;
+CREATE TRIGGER trg_system_overview_checked_alphas_delete
+AFTER DELETE ON checked_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count - 1
+    WHERE table_name = 'checked_alphas';
+END;
+
+INSERT OR REPLACE INTO system_overview_cache (table_name, record_count, latest_update)
+SELECT 'checked_alphas', COUNT(*), MAX(checked_at) FROM checked_alphas;
+
+-- submitable_alphas
+DROP TRIGGER IF EXISTS trg_system_overview_submitable_alphas_insert;
+CREATE TRIGGER trg_system_overview_submitable_alphas_insert
+AFTER INSERT ON submitable_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count + 1, latest_update = COALESCE(MAX(latest_update, NEW.created_at), NEW.created_at, latest_update)
+    WHERE table_name = 'submitable_alphas';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_submitable_alphas_update;
+CREATE TRIGGER trg_system_overview_submitable_alphas_update
+AFTER UPDATE ON submitable_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET latest_update = COALESCE(MAX(latest_update, NEW.created_at), NEW.created_at, latest_update)
+    WHERE table_name = 'submitable_alphas';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_submitable_alphas_delete;
+CREATE TRIGGER trg_system_overview_submitable_alphas_delete
+AFTER DELETE ON submitable_alphas
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count - 1
+    WHERE table_name = 'submitable_alphas';
+END;
+
+INSERT OR REPLACE INTO system_overview_cache (table_name, record_count, latest_update)
+SELECT 'submitable_alphas', COUNT(*), MAX(created_at) FROM submitable_alphas;
+
+-- daily_submit_stats
+DROP TRIGGER IF EXISTS trg_system_overview_daily_submit_stats_insert;
+CREATE TRIGGER trg_system_overview_daily_submit_stats_insert
+AFTER INSERT ON daily_submit_stats
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count + 1, latest_update = COALESCE(MAX(latest_update, NEW.last_updated), NEW.last_updated, latest_update)
+    WHERE table_name = 'daily_submit_stats';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_daily_submit_stats_update;
+CREATE TRIGGER trg_system_overview_daily_submit_stats_update
+AFTER UPDATE ON daily_submit_stats
+BEGIN
+    UPDATE system_overview_cache
+    SET latest_update = COALESCE(MAX(latest_update, NEW.last_updated), NEW.last_updated, latest_update)
+    WHERE table_name = 'daily_submit_stats';
+END;
+
+DROP TRIGGER IF EXISTS trg_system_overview_daily_submit_stats_delete;
+CREATE TRIGGER trg_system_overview_daily_submit_stats_delete
+AFTER DELETE ON daily_submit_stats
+BEGIN
+    UPDATE system_overview_cache
+    SET record_count = record_count - 1
+    WHERE table_name = 'daily_submit_stats';
+END;
+
+INSERT OR REPLACE INTO system_overview_cache (table_name, record_count, latest_update)
+SELECT 'daily_submit_stats', COUNT(*), MAX(last_updated) FROM daily_submit_stats;
+
+DROP VIEW IF EXISTS system_overview;
+CREATE VIEW system_overview AS
+SELECT table_name, record_count, latest_update
+FROM system_overview_cache;
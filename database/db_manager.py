@@ -7,61 +7,446 @@
 
 import os
 import sqlite3
-import pandas as pd
 import threading
+import queue
+import itertools
 from contextlib import contextmanager
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Iterator, TYPE_CHECKING
 from datetime import datetime
+from urllib.parse import quote
 import sys
 import json
+import logging
+
+# orjson 为可选依赖：已安装时用于反序列化JSON字段（比标准库json快2-3倍），否则回退到json
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 # 添加src目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from config import ROOT_PATH
 
+if TYPE_CHECKING:
+    # pandas 仅在返回DataFrame的方法中按需导入，避免只使用其他接口的进程承担导入开销
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# submitable_alphas 查询返回的字段（为了兼容性，alpha_id 以 id 返回）
+ALPHA_SELECT_COLUMNS = {
+    'id': 'alpha_id', 'type': 'type', 'author': 'author', 'instrument_type': 'instrument_type',
+    'region': 'region', 'universe': 'universe', 'delay': 'delay', 'decay': 'decay',
+    'neutralization': 'neutralization', 'truncation': 'truncation', 'pasteurization': 'pasteurization',
+    'unit_handling': 'unit_handling', 'nan_handling': 'nan_handling', 'language': 'language',
+    'visualization': 'visualization', 'code': 'code', 'description': 'description',
+    'operator_count': 'operator_count', 'date_created': 'date_created', 'date_submitted': 'date_submitted',
+    'date_modified': 'date_modified', 'name': 'name', 'favorite': 'favorite', 'hidden': 'hidden',
+    'color': 'color', 'category': 'category', 'tags': 'tags', 'classifications': 'classifications',
+    'grade': 'grade', 'stage': 'stage', 'status': 'status', 'pnl': 'pnl', 'book_size': 'book_size',
+    'long_count': 'long_count', 'short_count': 'short_count', 'turnover': 'turnover',
+    'returns': 'returns', 'drawdown': 'drawdown', 'margin': 'margin', 'fitness': 'fitness',
+    'sharpe': 'sharpe', 'start_date': 'start_date', 'checks': 'checks', 'os': 'os', 'train': 'train',
+    'test': 'test', 'prod': 'prod', 'competitions': 'competitions', 'themes': 'themes', 'team': 'team',
+    'pyramids': 'pyramids', 'aggressive_mode': 'aggressive_mode', 'self_corr': 'self_corr',
+    'prod_corr': 'prod_corr', 'recheck_flag': 'recheck_flag', 'created_at': 'created_at',
+}
+
+# submitable_alphas 可写入的字段，及写入时未提供值的字段所使用的默认值
+SUBMITABLE_COLUMNS = tuple(ALPHA_SELECT_COLUMNS.values())
+SUBMITABLE_DEFAULTS = {
+    'favorite': 'FALSE',
+    'hidden': 'FALSE',
+    'recheck_flag': 'FALSE',
+    'created_at': 'CURRENT_TIMESTAMP',
+}
+
+# 字段集合固定，UPSERT语句在模块加载时一次构建，SQL文本不随 alpha_data 的键变化，可复用已编译的语句。
+# 未提供的字段绑定为NULL，有默认值的字段通过 COALESCE 回落到默认值，与原 INSERT OR REPLACE 的结果一致
+SUBMITABLE_UPSERT_SQL = """
+    INSERT INTO submitable_alphas ({columns})
+    VALUES ({values})
+    ON CONFLICT(alpha_id) DO UPDATE SET {updates}
+""".format(
+    columns=', '.join(SUBMITABLE_COLUMNS),
+    values=', '.join(
+        f"COALESCE(?, {SUBMITABLE_DEFAULTS[column]})" if column in SUBMITABLE_DEFAULTS else '?'
+        for column in SUBMITABLE_COLUMNS
+    ),
+    updates=', '.join(f"{column} = excluded.{column}" for column in SUBMITABLE_COLUMNS if column != 'alpha_id'),
+)
+
+# 只插入新因子的多行VALUES中每行的占位符（默认值处理同上）；已存在的因子保持不变，RETURNING 取回新插入的ID
+SUBMITABLE_VALUES_ROW = '({})'.format(', '.join(
+    f"COALESCE(?, {SUBMITABLE_DEFAULTS[column]})" if column in SUBMITABLE_DEFAULTS else '?'
+    for column in SUBMITABLE_COLUMNS
+))
+SUBMITABLE_INSERT_NEW_SQL = """
+    INSERT INTO submitable_alphas ({columns})
+    VALUES {{values}}
+    ON CONFLICT(alpha_id) DO NOTHING
+    RETURNING alpha_id
+""".format(columns=', '.join(SUBMITABLE_COLUMNS))
+
+# get_submitable_alphas 返回的字段
+SUBMITABLE_DF_COLUMNS = [column for column in ALPHA_SELECT_COLUMNS if column != 'recheck_flag']
+
+def build_alpha_select_list(columns: List[str]) -> str:
+    """将返回字段名转换为SELECT字段列表（如 'alpha_id as id, type, ...'）"""
+    items = []
+    for column in columns:
+        source = ALPHA_SELECT_COLUMNS[column]
+        items.append(source if source == column else f"{source} as {column}")
+    return ', '.join(items)
+
+# 常用的完整字段列表在模块加载时构建一次，各方法拼出的SQL文本保持一致，可复用已编译的语句
+ALPHA_SELECT_LIST = build_alpha_select_list(list(ALPHA_SELECT_COLUMNS))
+SUBMITABLE_DF_SELECT_LIST = build_alpha_select_list(SUBMITABLE_DF_COLUMNS)
+
+# 以JSON字符串存储的复杂字段
+ALPHA_JSON_FIELDS = frozenset(['tags', 'classifications', 'checks', 'os', 'train', 'test', 'prod',
+                               'competitions', 'themes', 'team', 'pyramids'])
+
+def build_filter_templates(select_sql: str, filters: Tuple[str, ...], suffix: str) -> Dict[Tuple[bool, ...], str]:
+    """
+    为可选过滤条件的每种组合预先生成完整的SQL文本
+
+    Args:
+        select_sql: WHERE之前的查询部分
+        filters: 各可选过滤条件（如 'dataset_id = ?'），顺序即参数顺序
+        suffix: WHERE之后的部分（ORDER BY / LIMIT 等）
+
+    Returns:
+        Dict: 以各条件是否启用的布尔元组为键的SQL文本
+    """
+    templates = {}
+    for flags in itertools.product((False, True), repeat=len(filters)):
+        conditions = [condition for condition, enabled in zip(filters, flags) if enabled]
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        templates[flags] = f"{select_sql} {where_clause} {suffix}"
+    return templates
+
+# get_failed_expressions 的查询模板：同一过滤组合始终使用同一SQL文本，可命中连接的已编译语句缓存
+# get_failed_expressions_raw 返回的元组中各字段的顺序
+FAILED_EXPRESSION_COLUMNS = ('id', 'expression', 'dataset_id', 'region', 'step',
+                             'failure_reason', 'error_details', 'created_at')
+FAILED_EXPRESSIONS_QUERIES = build_filter_templates(
+    f"SELECT {', '.join(FAILED_EXPRESSION_COLUMNS)} FROM failed_expressions",
+    ("dataset_id = ?", "region = ?", "step = ?",
+     "id IN (SELECT rowid FROM failed_expressions_fts WHERE failure_reason LIKE ?)"),
+    "ORDER BY created_at DESC LIMIT ?",
+)
+# 全文索引 failed_expressions_fts（见 failed_expressions_fts.sql）不存在时，失败原因过滤直接在原表上执行 LIKE
+FAILED_EXPRESSIONS_LIKE_QUERIES = build_filter_templates(
+    f"SELECT {', '.join(FAILED_EXPRESSION_COLUMNS)} FROM failed_expressions",
+    ("dataset_id = ?", "region = ?", "step = ?", "failure_reason LIKE ?"),
+    "ORDER BY created_at DESC LIMIT ?",
+)
+
+# 旧结构 daily_submit_stats（date UNIQUE，无 (date, timezone) 唯一约束）的原有写法：读出当前计数累加后整行替换
+DAILY_STATS_LEGACY_REPLACE_SQL = """
+    INSERT OR REPLACE INTO daily_submit_stats 
+    (date, successful_submits, total_attempts, timezone, last_updated)
+    VALUES (
+        ?,
+        COALESCE((SELECT successful_submits FROM daily_submit_stats WHERE date = ? AND timezone = ?), 0) + ?,
+        COALESCE((SELECT total_attempts FROM daily_submit_stats WHERE date = ? AND timezone = ?), 0) + ?,
+        ?,
+        datetime('now')
+    )
+"""
+
+# get_failure_stats 的全部统计合并为一条语句：总数、去重数、最近24小时数和长度统计共用一次全表扫描，
+# 按原因/按数据集的前10名分组结果以JSON数组返回，整体只需一次往返
+FAILURE_STATS_SQL = """
+    SELECT
+        COUNT(*),
+        COUNT(DISTINCT expression),
+        COALESCE(SUM(created_at >= datetime('now', '-1 day')), 0),
+        AVG(LENGTH(expression)),
+        MIN(LENGTH(expression)),
+        MAX(LENGTH(expression)),
+        (SELECT json_group_array(json_object(
+                    'reason', failure_reason, 'count', count,
+                    'unique_expressions', unique_count, 'affected_datasets', affected_datasets))
+         FROM (SELECT failure_reason, COUNT(*) as count,
+                      COUNT(DISTINCT expression) as unique_count,
+                      COUNT(DISTINCT dataset_id) as affected_datasets
+               FROM failed_expressions
+               WHERE failure_reason IS NOT NULL
+               GROUP BY failure_reason
+               ORDER BY count DESC
+               LIMIT 10)),
+        (SELECT json_group_array(json_object(
+                    'dataset_id', dataset_id, 'region', region, 'step', step, 'count', count,
+                    'unique_expressions', unique_expressions, 'failure_types', failure_types))
+         FROM (SELECT dataset_id, region, step, COUNT(*) as count,
+                      COUNT(DISTINCT expression) as unique_expressions,
+                      COUNT(DISTINCT failure_reason) as failure_types
+               FROM failed_expressions
+               GROUP BY dataset_id, region, step
+               ORDER BY count DESC
+               LIMIT 10))
+    FROM failed_expressions
+"""
+
 class FactorDatabaseManager:
-    """因子数据库管理器"""
+    """因子数据库管理器
+    
+    同一数据库路径在进程内只创建一个实例，各处 FactorDatabaseManager(db_path)
+    拿到的是同一个对象，共享其连接，schema 初始化也只执行一次。
+    """
+    
+    READ_POOL_SIZE = 16  # 只读连接池上限
+    QUERY_CACHE_SIZE = 128  # 查询结果缓存条目上限
+    
+    _instances: Dict[str, 'FactorDatabaseManager'] = {}
+    _instances_lock = threading.Lock()
+    
+    def __new__(cls, db_path='database/factors.db'):
+        full_path = os.path.join(ROOT_PATH, db_path)
+        with cls._instances_lock:
+            instance = cls._instances.get(full_path)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[full_path] = instance
+            return instance
     
     def __init__(self, db_path='database/factors.db'):
         """初始化数据库管理器"""
-        self.db_path = os.path.join(ROOT_PATH, db_path)
-        self._local = threading.local()  # 线程本地存储
-        
-        # 确保数据库目录存在
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        # 初始化数据库（如果不存在）
-        self._init_database()
+        with self._instances_lock:
+            if self._initialized:
+                return
+            
+            self.db_path = os.path.join(ROOT_PATH, db_path)
+            self._local = threading.local()  # 线程本地存储（事务状态）
+            self._write_lock = threading.RLock()  # 串行化对写连接的使用
+            self._writer = None
+            self._read_pool = queue.LifoQueue()  # 只读连接池，后进先出以复用缓存较热的连接
+            self._read_pool_lock = threading.Lock()
+            self._read_connections_created = 0
+            self._failed_expressions_queries = FAILED_EXPRESSIONS_LIKE_QUERIES  # 全文索引就绪后切换为FTS查询
+            self._query_cache = {}  # 查询结果缓存：key -> (表变更标记, 结果)
+            self._query_cache_lock = threading.Lock()
+            self._daily_stats_upsert = False  # daily_submit_stats 已确认有 (date, timezone) 唯一约束
+            
+            # 确保数据库目录存在
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            
+            # 初始化数据库结构
+            self._init_database()
+            self._initialized = True
     
     def _init_database(self):
-        """初始化数据库"""
+        """初始化数据库
+        
+        仅在数据库文件不存在时按 schema.sql 和 daily_submit_stats.sql 建库；已有数据库启动时不修改结构
+        （不建索引、不写入），其结构升级由 upgrade_schema.py 按版本显式执行
+        """
         if not os.path.exists(self.db_path):
             schema_path = os.path.join(ROOT_PATH, 'database', 'schema.sql')
             if os.path.exists(schema_path):
                 with self.get_connection() as conn:
                     with open(schema_path, 'r', encoding='utf-8') as f:
                         conn.executescript(f.read())
+                    with open(os.path.join(ROOT_PATH, 'database', 'daily_submit_stats.sql'), 'r', encoding='utf-8') as f:
+                        conn.executescript(f.read())
+                    self._create_failure_reason_fts(conn)
+        
+        # 全文索引已存在（新建或已升级的数据库）时，失败原因过滤改用FTS查询
+        try:
+            with self._read_connection() as conn:
+                if self._table_exists(conn, 'failed_expressions_fts'):
+                    self._failed_expressions_queries = FAILED_EXPRESSIONS_QUERIES
+        except sqlite3.Error as e:
+            logger.warning("检查失败原因全文索引失败: %s", e)
+    
+    def _create_failure_reason_fts(self, conn: sqlite3.Connection):
+        """新建数据库时创建失败原因的trigram全文索引，SQLite不支持时保留原表 LIKE 查询"""
+        fts_path = os.path.join(ROOT_PATH, 'database', 'failed_expressions_fts.sql')
+        try:
+            with open(fts_path, 'r', encoding='utf-8') as f:
+                conn.executescript(f.read())
+        except (OSError, sqlite3.OperationalError) as e:
+            # 缺少FTS5模块或trigram分词器（SQLite 3.34以下）
+            logger.info("失败原因全文索引不可用，使用 LIKE 查询: %s", e)
+    
+    def _table_exists(self, conn: sqlite3.Connection, table_name: str) -> bool:
+        """检查表（含虚拟表）是否存在"""
+        cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+        return cursor.fetchone() is not None
+    
+    def _apply_pragmas(self, connection: sqlite3.Connection):
+        """设置连接级PRAGMA"""
+        # WAL模式下 synchronous=NORMAL 不会损坏数据库，仅在掉电时可能丢失最近提交的事务，
+        # 可省去每次提交的fsync；busy_timeout 由SQLite C层的忙等待处理器实现，替代Python层的timeout参数
+        connection.executescript("""
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -65536;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA busy_timeout = 30000;
+        """)
+    
+    def _connect(self):
+        """获取写连接，首次调用时创建
+        
+        所有线程共用同一个写连接，由 self._write_lock 串行化，
+        各线程的写操作不会再被其他线程的回滚波及
+        """
+        with self._write_lock:
+            if self._writer is None:
+                connection = sqlite3.connect(
+                    self.db_path,
+                    check_same_thread=False,
+                    cached_statements=256  # 各方法的SQL均为固定字面量，按SQL文本复用已编译的语句
+                )
+                connection.execute("PRAGMA foreign_keys = ON")
+                # 提升并发性能；WAL会持久写入数据库文件，文件系统不支持时（如部分网络挂载）SQLite保持原模式
+                journal_mode = connection.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+                if journal_mode.lower() != 'wal':
+                    logger.warning("数据库未能切换到WAL模式，当前日志模式: %s", journal_mode)
+                self._apply_pragmas(connection)
+                self._writer = connection
+            return self._writer
     
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(
-                self.db_path,
-                check_same_thread=False,
-                timeout=30.0
-            )
-            self._local.connection.execute("PRAGMA foreign_keys = ON")
-            self._local.connection.execute("PRAGMA journal_mode = WAL")  # 提升并发性能
+        """获取数据库（写）连接的上下文管理器"""
+        with self._write_lock:
+            connection = self._connect()
+            if getattr(self._local, 'in_txn', False):
+                # 处于 transaction() 中时不单独提交，由外层事务统一提交或回滚
+                yield connection
+                return
+            
+            try:
+                yield connection
+            except Exception:
+                connection.rollback()
+                raise
+            else:
+                connection.commit()
+    
+    def _open_read_connection(self) -> sqlite3.Connection:
+        """以 mode=ro 打开一个只读连接"""
+        # 先确保写连接已创建：数据库文件存在且已切换为WAL模式
+        self._connect()
+        connection = sqlite3.connect(
+            f"file:{quote(self.db_path)}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        self._apply_pragmas(connection)
+        return connection
+    
+    @contextmanager
+    def _read_connection(self):
+        """从只读连接池借用一个连接的上下文管理器
+        
+        连接池最多 READ_POOL_SIZE 个以 mode=ro 打开的只读连接，按需创建，用完归还，
+        连接数及其页缓存不再随线程数增长；池中连接耗尽时等待其他线程归还。
+        WAL模式下读操作不会阻塞写连接。
+        当前线程处于 transaction() 中时返回写连接，以便读到事务内尚未提交的修改。
+        """
+        if getattr(self._local, 'in_txn', False):
+            with self.get_connection() as connection:
+                yield connection
+            return
         
         try:
-            yield self._local.connection
-        except Exception:
-            self._local.connection.rollback()
-            raise
-        else:
-            self._local.connection.commit()
+            connection = self._read_pool.get_nowait()
+        except queue.Empty:
+            with self._read_pool_lock:
+                create = self._read_connections_created < self.READ_POOL_SIZE
+                if create:
+                    self._read_connections_created += 1
+            if create:
+                try:
+                    connection = self._open_read_connection()
+                except Exception:
+                    with self._read_pool_lock:
+                        self._read_connections_created -= 1
+                    raise
+            else:
+                connection = self._read_pool.get()
+        
+        try:
+            yield connection
+        finally:
+            self._read_pool.put(connection)
+    
+    @contextmanager
+    def transaction(self):
+        """显式事务的上下文管理器
+        
+        块内调用的各方法不再各自提交，退出时统一提交一次（异常时回滚），
+        多次批量写入只需一次fsync。嵌套使用时并入最外层事务。
+        事务期间当前线程独占写连接。
+        
+        用法:
+            with db_manager.transaction():
+                for batch in batches:
+                    db_manager.add_factor_expressions_batch(batch, dataset_id, region, step)
+        """
+        with self._write_lock:
+            connection = self._connect()
+            if getattr(self._local, 'in_txn', False):
+                yield connection
+                return
+            
+            connection.execute("BEGIN IMMEDIATE")
+            self._local.in_txn = True
+            try:
+                yield connection
+            except Exception:
+                connection.rollback()
+                raise
+            else:
+                connection.commit()
+            finally:
+                self._local.in_txn = False
+    
+    def _table_epoch(self, conn: sqlite3.Connection, table_name: str) -> Optional[Tuple]:
+        """读取表的变更计数，表有任何增删改时随之变化
+        
+        计数由 schema.sql 中的触发器维护；表不在 table_change_counter 中时返回None（不缓存）
+        """
+        try:
+            cursor = conn.execute(
+                "SELECT change_count FROM table_change_counter WHERE table_name = ?", (table_name,)
+            )
+        except sqlite3.OperationalError:
+            return None
+        return cursor.fetchone()
+    
+    def _cached_read(self, conn: sqlite3.Connection, key: Tuple, table_name: str, loader):
+        """按表的变更标记缓存查询结果：标记未变时直接返回上次结果，否则调用 loader 重新查询
+        
+        事务内可能读到未提交的数据，不做缓存
+        """
+        epoch = None if getattr(self._local, 'in_txn', False) else self._table_epoch(conn, table_name)
+        if epoch is None:
+            return loader()
+        
+        with self._query_cache_lock:
+            cached = self._query_cache.get(key)
+        if cached is not None and cached[0] == epoch:
+            return cached[1]
+        
+        value = loader()
+        with self._query_cache_lock:
+            self._query_cache.pop(key, None)
+            if len(self._query_cache) >= self.QUERY_CACHE_SIZE:
+                # 淘汰最早写入的结果
+                self._query_cache.pop(next(iter(self._query_cache)))
+            self._query_cache[key] = (epoch, value)
+        return value
     
     # ====================================================================
     # 因子表达式相关操作
@@ -77,52 +462,138 @@ class FactorDatabaseManager:
                     VALUES (?, ?, ?, ?)
                 """, (expression, dataset_id, region, step))
                 return True
-        except Exception as e:
-            print(f"添加因子表达式失败: {e}")
+        except Exception:
+            logger.exception("添加因子表达式失败")
             return False
     
+    def _load_batch_stage(self, conn: sqlite3.Connection, values: List[str], chunk_size: int = 500):
+        """将一批值写入临时暂存表 temp.batch_stage（批内去重，保留首次出现的顺序）
+        
+        暂存表为连接级TEMP表（temp_store=MEMORY，位于内存），以多行VALUES分块写入，
+        之后由 INSERT ... SELECT 在库内一次性写入目标表，行数据不再逐条经过Python。
+        不使用 ATTACH ':memory:'，因为 ATTACH 不能在 transaction() 的事务内执行。
+        """
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS batch_stage (
+                seq INTEGER PRIMARY KEY,
+                value TEXT NOT NULL UNIQUE
+            )
+        """)
+        conn.execute("DELETE FROM temp.batch_stage")
+        for i in range(0, len(values), chunk_size):
+            chunk = list(values[i:i + chunk_size])
+            placeholders = ', '.join(['(?)' for _ in chunk])
+            conn.execute(f"INSERT OR IGNORE INTO temp.batch_stage (value) VALUES {placeholders}", chunk)
+    
     def add_factor_expressions_batch(self, expressions: List[str], dataset_id: str, region: str, step: int) -> int:
         """批量添加因子表达式"""
         try:
             with self.get_connection() as conn:
-                data = [(expr, dataset_id, region, step) for expr in expressions]
-                cursor = conn.executemany("""
+                self._load_batch_stage(conn, expressions)
+                cursor = conn.execute("""
                     INSERT OR IGNORE INTO factor_expressions 
                     (expression, dataset_id, region, step) 
-                    VALUES (?, ?, ?, ?)
-                """, data)
+                    SELECT value, ?, ?, ? FROM temp.batch_stage ORDER BY seq
+                """, (dataset_id, region, step))
+                conn.execute("DELETE FROM temp.batch_stage")
                 return cursor.rowcount
-        except Exception as e:
-            print(f"批量添加因子表达式失败: {e}")
+        except Exception:
+            logger.exception("批量添加因子表达式失败")
             return 0
-    
+
+    def insert_new_factor_expressions(self, expressions: List[str], dataset_id: str, region: str, step: int,
+                                      chunk_size: int = 500) -> List[str]:
+        """批量插入因子表达式，返回实际新插入的表达式
+
+        去重由数据库的唯一约束完成（ON CONFLICT DO NOTHING），通过 RETURNING 取回新插入的行，
+        代替“先 is_expression_exists 再 add_factor_expression”的逐条调用。需要 SQLite 3.35+。
+        executemany 不返回结果行，因此按块拼接多行 VALUES 执行。
+        """
+        try:
+            inserted = []
+            with self.get_connection() as conn:
+                for i in range(0, len(expressions), chunk_size):
+                    chunk = expressions[i:i + chunk_size]
+                    values = ', '.join(['(?, ?, ?, ?)' for _ in chunk])
+                    params = []
+                    for expr in chunk:
+                        params.extend((expr, dataset_id, region, step))
+                    cursor = conn.execute(f"""
+                        INSERT INTO factor_expressions
+                        (expression, dataset_id, region, step)
+                        VALUES {values}
+                        ON CONFLICT DO NOTHING
+                        RETURNING expression
+                    """, params)
+                    inserted.extend(row[0] for row in cursor)
+            return inserted
+        except Exception:
+            logger.exception("批量插入新因子表达式失败")
+            return []
+
     def get_factor_expressions(self, dataset_id: str, region: str, step: int) -> List[str]:
         """获取因子表达式列表"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT expression FROM factor_expressions 
                     WHERE dataset_id = ? AND region = ? AND step = ?
                     ORDER BY created_at
                 """, (dataset_id, region, step))
-                return [row[0] for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"获取因子表达式失败: {e}")
+                return [row[0] for row in cursor]
+        except Exception:
+            logger.exception("获取因子表达式失败")
             return []
+
+    def get_factor_expressions_set(self, dataset_id: str, region: str, step: int) -> set:
+        """获取因子表达式集合（不排序，用于去重判断）"""
+        try:
+            with self._read_connection() as conn:
+                cursor = conn.execute("""
+                    SELECT expression FROM factor_expressions 
+                    WHERE dataset_id = ? AND region = ? AND step = ?
+                """, (dataset_id, region, step))
+                return {row[0] for row in cursor}
+        except Exception:
+            logger.exception("获取因子表达式失败")
+            return set()
     
     def is_expression_exists(self, expression: str, dataset_id: str, region: str, step: int) -> bool:
         """检查表达式是否存在"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
-                    SELECT COUNT(*) FROM factor_expressions 
+                    SELECT 1 FROM factor_expressions 
                     WHERE expression = ? AND dataset_id = ? AND region = ? AND step = ?
+                    LIMIT 1
                 """, (expression, dataset_id, region, step))
-                return cursor.fetchone()[0] > 0
-        except Exception as e:
-            print(f"检查表达式存在性失败: {e}")
+                return cursor.fetchone() is not None
+        except Exception:
+            logger.exception("检查表达式存在性失败")
             return False
-    
+
+    def filter_new_expressions(self, expressions: List[str], dataset_id: str, region: str, step: int,
+                               chunk_size: int = 500) -> List[str]:
+        """过滤出数据库中尚不存在的表达式（保持原有顺序）
+
+        以 IN 列表分块批量查询已存在的表达式，代替逐条调用 is_expression_exists
+        """
+        try:
+            existing = set()
+            with self._read_connection() as conn:
+                for i in range(0, len(expressions), chunk_size):
+                    chunk = expressions[i:i + chunk_size]
+                    placeholders = ', '.join(['?' for _ in chunk])
+                    cursor = conn.execute(f"""
+                        SELECT expression FROM factor_expressions
+                        WHERE expression IN ({placeholders}) AND dataset_id = ? AND region = ? AND step = ?
+                    """, list(chunk) + [dataset_id, region, step])
+                    existing.update(row[0] for row in cursor)
+            return [expr for expr in expressions if expr not in existing]
+        except Exception:
+            logger.exception("过滤新表达式失败")
+            return list(expressions)
+
     # ====================================================================
     # 已检查因子相关操作
     # ====================================================================
@@ -137,50 +608,70 @@ class FactorDatabaseManager:
                     VALUES (?, ?, ?, ?)
                 """, (alpha_id, dataset_id, region, step))
                 return True
-        except Exception as e:
-            print(f"添加已检查Alpha失败: {e}")
+        except Exception:
+            logger.exception("添加已检查Alpha失败")
             return False
     
     def add_checked_alphas_batch(self, alpha_ids: List[str], dataset_id: str, region: str, step: int) -> int:
         """批量添加已检查的Alpha ID"""
         try:
             with self.get_connection() as conn:
-                data = [(alpha_id, dataset_id, region, step) for alpha_id in alpha_ids]
-                cursor = conn.executemany("""
+                self._load_batch_stage(conn, alpha_ids)
+                cursor = conn.execute("""
                     INSERT OR IGNORE INTO checked_alphas 
                     (alpha_id, dataset_id, region, step) 
-                    VALUES (?, ?, ?, ?)
-                """, data)
+                    SELECT value, ?, ?, ? FROM temp.batch_stage ORDER BY seq
+                """, (dataset_id, region, step))
+                conn.execute("DELETE FROM temp.batch_stage")
                 return cursor.rowcount
-        except Exception as e:
-            print(f"批量添加已检查Alpha失败: {e}")
+        except Exception:
+            logger.exception("批量添加已检查Alpha失败")
             return 0
     
     def get_checked_alphas(self, dataset_id: str, region: str, step: int) -> List[str]:
         """获取已检查的Alpha ID列表"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
+                def load():
+                    cursor = conn.execute("""
+                        SELECT alpha_id FROM checked_alphas 
+                        WHERE dataset_id = ? AND region = ? AND step = ?
+                        ORDER BY checked_at
+                    """, (dataset_id, region, step))
+                    return [row[0] for row in cursor]
+                
+                # checked_alphas 未变化时复用上次结果；返回副本，调用方修改列表不影响缓存
+                key = ('checked_alphas', dataset_id, region, step)
+                return list(self._cached_read(conn, key, 'checked_alphas', load))
+        except Exception:
+            logger.exception("获取已检查Alpha失败")
+            return []
+
+    def get_checked_alphas_set(self, dataset_id: str, region: str, step: int) -> set:
+        """获取已检查的Alpha ID集合（不排序，用于去重判断）"""
+        try:
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT alpha_id FROM checked_alphas 
                     WHERE dataset_id = ? AND region = ? AND step = ?
-                    ORDER BY checked_at
                 """, (dataset_id, region, step))
-                return [row[0] for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"获取已检查Alpha失败: {e}")
-            return []
+                return {row[0] for row in cursor}
+        except Exception:
+            logger.exception("获取已检查Alpha失败")
+            return set()
     
     def is_alpha_checked(self, alpha_id: str, dataset_id: str, region: str, step: int) -> bool:
         """检查Alpha是否已被检查"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.execute("""
-                    SELECT COUNT(*) FROM checked_alphas 
+                    SELECT 1 FROM checked_alphas 
                     WHERE alpha_id = ? AND dataset_id = ? AND region = ? AND step = ?
+                    LIMIT 1
                 """, (alpha_id, dataset_id, region, step))
-                return cursor.fetchone()[0] > 0
-        except Exception as e:
-            print(f"检查Alpha检查状态失败: {e}")
+                return cursor.fetchone() is not None
+        except Exception:
+            logger.exception("检查Alpha检查状态失败")
             return False
     
     # ====================================================================
@@ -188,46 +679,111 @@ class FactorDatabaseManager:
     # ====================================================================
     
     def add_submitable_alpha(self, alpha_data: Dict[str, Any]) -> bool:
-        """添加可提交因子"""
+        """添加可提交因子（已存在时原地更新）"""
         try:
+            unknown_columns = alpha_data.keys() - set(SUBMITABLE_COLUMNS)
+            if unknown_columns:
+                raise ValueError(f"未知字段: {', '.join(sorted(unknown_columns))}")
+            
             with self.get_connection() as conn:
-                # 构建插入SQL
-                columns = list(alpha_data.keys())
-                placeholders = ', '.join(['?' for _ in columns])
-                column_names = ', '.join(columns)
-                
-                sql = f"""
-                    INSERT OR REPLACE INTO submitable_alphas ({column_names})
-                    VALUES ({placeholders})
-                """
-                
-                conn.execute(sql, list(alpha_data.values()))
+                conn.execute(SUBMITABLE_UPSERT_SQL, tuple(alpha_data.get(column) for column in SUBMITABLE_COLUMNS))
                 return True
-        except Exception as e:
-            print(f"添加可提交因子失败: {e}")
+        except Exception:
+            logger.exception("添加可提交因子失败")
             return False
     
-    def get_submitable_alphas(self) -> pd.DataFrame:
-        """获取所有可提交因子"""
+    def add_submitable_alphas_bulk(self, rows: List[Dict[str, Any]]) -> int:
+        """批量添加可提交因子（已存在时原地更新），所有行在同一事务中写入
+        
+        Returns:
+            int: 写入的行数，失败时返回0
+        """
         try:
+            known_columns = set(SUBMITABLE_COLUMNS)
+            for alpha_data in rows:
+                unknown_columns = alpha_data.keys() - known_columns
+                if unknown_columns:
+                    raise ValueError(f"未知字段: {', '.join(sorted(unknown_columns))}")
+            
             with self.get_connection() as conn:
-                # 为了兼容性，将alpha_id重命名为id
-                return pd.read_sql_query("""
-                    SELECT alpha_id as id, type, author, instrument_type, region, universe, 
-                           delay, decay, neutralization, truncation, pasteurization, 
-                           unit_handling, nan_handling, language, visualization, code, 
-                           description, operator_count, date_created, date_submitted, 
-                           date_modified, name, favorite, hidden, color, category, 
-                           tags, classifications, grade, stage, status, pnl, book_size,
-                           long_count, short_count, turnover, returns, drawdown, margin,
-                           fitness, sharpe, start_date, checks, os, train, test, prod,
-                           competitions, themes, team, pyramids, aggressive_mode, 
-                           self_corr, prod_corr, created_at
-                    FROM submitable_alphas 
-                    ORDER BY self_corr , prod_corr 
-                """, conn)
-        except Exception as e:
-            print(f"获取可提交因子失败: {e}")
+                conn.executemany(SUBMITABLE_UPSERT_SQL, (
+                    tuple(alpha_data.get(column) for column in SUBMITABLE_COLUMNS)
+                    for alpha_data in rows
+                ))
+                return len(rows)
+        except Exception:
+            logger.exception("批量添加可提交因子失败")
+            return 0
+    
+    def insert_new_submitable_alphas(self, rows: List[Dict[str, Any]], chunk_size: int = 100) -> Optional[List[str]]:
+        """批量插入可提交因子，已存在的因子保持不变，返回实际新插入的alpha_id
+        
+        去重由主键约束完成（ON CONFLICT DO NOTHING），通过 RETURNING 取回新插入的行，
+        代替“先 is_alpha_submitable 再 add_submitable_alpha”的逐条调用。需要 SQLite 3.35+。
+        插入失败时整批回滚并返回None，以便调用方区分“全部已存在”（空列表）与失败。
+        """
+        try:
+            known_columns = set(SUBMITABLE_COLUMNS)
+            for alpha_data in rows:
+                unknown_columns = alpha_data.keys() - known_columns
+                if unknown_columns:
+                    raise ValueError(f"未知字段: {', '.join(sorted(unknown_columns))}")
+            
+            inserted = []
+            with self.get_connection() as conn:
+                for i in range(0, len(rows), chunk_size):
+                    chunk = rows[i:i + chunk_size]
+                    params = []
+                    for alpha_data in chunk:
+                        params.extend(alpha_data.get(column) for column in SUBMITABLE_COLUMNS)
+                    sql = SUBMITABLE_INSERT_NEW_SQL.format(values=', '.join([SUBMITABLE_VALUES_ROW] * len(chunk)))
+                    inserted.extend(row[0] for row in conn.execute(sql, params))
+            return inserted
+        except Exception:
+            logger.exception("批量插入新可提交因子失败")
+            return None
+    
+    def iter_submitable_alphas(self, chunksize: int = 10000, limit: Optional[int] = None) -> Iterator['pd.DataFrame']:
+        """分块读取可提交因子，每次产出一个最多 chunksize 行的DataFrame
+        
+        每块在各自的 _read_connection() 中以 LIMIT/OFFSET 分页读取，生成器挂起期间不占用连接池中的连接；
+        ORDER BY 末尾追加唯一的 alpha_id，保证分页顺序确定。
+        
+        Args:
+            chunksize: 每块行数
+            limit: 只读取按 self_corr, prod_corr 排序后的前 limit 行，为空时读取全部
+        """
+        # 为了兼容性，将alpha_id重命名为id；不返回 recheck_flag
+        sql = f"""
+            SELECT {SUBMITABLE_DF_SELECT_LIST}
+            FROM submitable_alphas 
+            ORDER BY self_corr , prod_corr , alpha_id
+            LIMIT ? OFFSET ?
+        """
+        
+        import pandas as pd
+        
+        offset = 0
+        while limit is None or offset < limit:
+            size = chunksize if limit is None else min(chunksize, limit - offset)
+            with self._read_connection() as conn:
+                chunk = pd.read_sql_query(sql, conn, params=(size, offset))
+            if chunk.empty:
+                return
+            yield chunk
+            if len(chunk) < size:
+                return
+            offset += len(chunk)
+    
+    def get_submitable_alphas(self, limit: Optional[int] = None) -> 'pd.DataFrame':
+        """获取所有可提交因子（limit 不为空时只取排序后的前 limit 行）"""
+        import pandas as pd
+        
+        try:
+            chunks = list(self.iter_submitable_alphas(limit=limit))
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        except Exception:
+            logger.exception("获取可提交因子失败")
             return pd.DataFrame()
     
     def remove_submitable_alpha(self, alpha_id: str) -> bool:
@@ -236,74 +792,111 @@ class FactorDatabaseManager:
             with self.get_connection() as conn:
                 cursor = conn.execute("DELETE FROM submitable_alphas WHERE alpha_id = ?", (alpha_id,))
                 return cursor.rowcount > 0
-        except Exception as e:
-            print(f"移除可提交因子失败: {e}")
+        except Exception:
+            logger.exception("移除可提交因子失败")
             return False
     
     def remove_submitable_alphas_batch(self, alpha_ids: List[str]) -> int:
         """批量移除可提交因子"""
         try:
             with self.get_connection() as conn:
-                placeholders = ', '.join(['?' for _ in alpha_ids])
-                cursor = conn.execute(f"DELETE FROM submitable_alphas WHERE alpha_id IN ({placeholders})", alpha_ids)
+                # ID先分块写入暂存表，DELETE 语句文本固定，不受参数个数上限限制
+                self._load_batch_stage(conn, alpha_ids)
+                cursor = conn.execute("""
+                    DELETE FROM submitable_alphas WHERE alpha_id IN (SELECT value FROM temp.batch_stage)
+                """)
+                conn.execute("DELETE FROM temp.batch_stage")
                 return cursor.rowcount
-        except Exception as e:
-            print(f"批量移除可提交因子失败: {e}")
+        except Exception:
+            logger.exception("批量移除可提交因子失败")
             return 0
     
     def is_alpha_submitable(self, alpha_id: str) -> bool:
         """检查Alpha是否可提交"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.execute("SELECT COUNT(*) FROM submitable_alphas WHERE alpha_id = ?", (alpha_id,))
-                return cursor.fetchone()[0] > 0
-        except Exception as e:
-            print(f"检查Alpha可提交状态失败: {e}")
+            with self._read_connection() as conn:
+                cursor = conn.execute("SELECT 1 FROM submitable_alphas WHERE alpha_id = ? LIMIT 1", (alpha_id,))
+                return cursor.fetchone() is not None
+        except Exception:
+            logger.exception("检查Alpha可提交状态失败")
             return False
     
-    def get_alphas_by_color(self, color: str) -> List[Dict]:
-        """获取指定颜色的Alpha列表"""
+    def _fetch_dicts(self, conn: sqlite3.Connection, sql: str, params=()) -> List[Dict[str, Any]]:
+        """执行查询并以字典列表返回结果，字典键为SELECT中的列名（别名）
+        
+        仅在本游标上使用 sqlite3.Row 工厂，由C层按列名取值，不影响连接上的其他查询
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor]
+    
+    def _build_alpha_select(self, columns: Optional[List[str]] = None) -> str:
+        """构建submitable_alphas的SELECT字段列表，columns为空时返回全部字段"""
+        if columns is None:
+            return ALPHA_SELECT_LIST
+        
+        for column in columns:
+            if column not in ALPHA_SELECT_COLUMNS:
+                raise ValueError(f"未知字段: {column}")
+        return build_alpha_select_list(columns)
+    
+    def _decode_alpha_row(self, row: sqlite3.Row) -> Dict:
+        """将查询行转换为字典，并反序列化其中的JSON字段"""
+        alpha_dict = dict(row)
+        for field in ALPHA_JSON_FIELDS:
+            value = alpha_dict.get(field)
+            if not value:
+                continue
+            # 与原实现一致：任何合法JSON（包括 null、数字、字符串）都按解析结果返回，解析失败才回落为空列表
+            try:
+                alpha_dict[field] = json_loads(value)
+            except (ValueError, TypeError):  # json.JSONDecodeError 与 orjson.JSONDecodeError 均为 ValueError 的子类
+                alpha_dict[field] = []
+        return alpha_dict
+    
+    def _query_alphas(self, where_clause: str, params: List[Any], columns: Optional[List[str]] = None) -> List[Dict]:
+        """按条件查询submitable_alphas并返回字典列表"""
+        with self._read_connection() as conn:
+            # 仅在本游标上使用Row工厂，不影响连接上的其他查询
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(f"""
+                SELECT {self._build_alpha_select(columns)}
+                FROM submitable_alphas 
+                {where_clause}
+                ORDER BY date_created DESC
+            """, params)
+            return [self._decode_alpha_row(row) for row in cursor]
+    
+    def get_alphas_by_color(self, color: str, columns: Optional[List[str]] = None) -> List[Dict]:
+        """获取指定颜色的Alpha列表
+        
+        Args:
+            color: 颜色
+            columns: 需要返回的字段，默认返回全部字段
+        """
         try:
-            with self.get_connection() as conn:
-                cursor = conn.execute("""
-                    SELECT alpha_id as id, type, author, instrument_type, region, universe, 
-                           delay, decay, neutralization, truncation, pasteurization, 
-                           unit_handling, nan_handling, language, visualization, code, 
-                           description, operator_count, date_created, date_submitted, 
-                           date_modified, name, favorite, hidden, color, category, 
-                           tags, classifications, grade, stage, status, pnl, book_size,
-                           long_count, short_count, turnover, returns, drawdown, margin,
-                           fitness, sharpe, start_date, checks, os, train, test, prod,
-                           competitions, themes, team, pyramids, aggressive_mode, 
-                           self_corr, prod_corr, recheck_flag, created_at
+            return self._query_alphas("WHERE color = ?", [color], columns)
+        except Exception:
+            logger.exception("获取%s颜色Alpha失败", color)
+            return []
+    
+    def get_alphas_by_color_df(self, color: str, columns: Optional[List[str]] = None) -> 'pd.DataFrame':
+        """获取指定颜色的Alpha列表（DataFrame形式，JSON字段保持原始字符串）"""
+        import pandas as pd
+        
+        try:
+            with self._read_connection() as conn:
+                return pd.read_sql_query(f"""
+                    SELECT {self._build_alpha_select(columns)}
                     FROM submitable_alphas 
                     WHERE color = ?
                     ORDER BY date_created DESC
-                """, (color,))
-                
-                columns = [description[0] for description in cursor.description]
-                rows = cursor.fetchall()
-                
-                # 转换为字典列表
-                result = []
-                for row in rows:
-                    alpha_dict = dict(zip(columns, row))
-                    
-                    # 处理复杂字段的JSON反序列化
-                    complex_fields = ['tags', 'classifications', 'checks', 'os', 'train', 'test', 'prod', 'competitions', 'themes', 'team', 'pyramids']
-                    for field in complex_fields:
-                        if field in alpha_dict and alpha_dict[field]:
-                            try:
-                                alpha_dict[field] = json.loads(alpha_dict[field])
-                            except (json.JSONDecodeError, TypeError):
-                                alpha_dict[field] = []
-                    
-                    result.append(alpha_dict)
-                
-                return result
-        except Exception as e:
-            print(f"获取{color}颜色Alpha失败: {e}")
-            return []
+                """, conn, params=(color,))
+        except Exception:
+            logger.exception("获取%s颜色Alpha失败", color)
+            return pd.DataFrame()
     
     # ====================================================================
     # 复查标记相关操作
@@ -320,58 +913,27 @@ class FactorDatabaseManager:
                     WHERE alpha_id IN ({placeholders})
                 """, [recheck_flag] + alpha_ids)
                 return cursor.rowcount
-        except Exception as e:
-            print(f"设置复查标记失败: {e}")
+        except Exception:
+            logger.exception("设置复查标记失败")
             return 0
     
-    def get_alphas_for_recheck(self, region: str = None) -> List[Dict]:
-        """获取需要复查的Alpha列表"""
+    def get_alphas_for_recheck(self, region: str = None, columns: Optional[List[str]] = None) -> List[Dict]:
+        """获取需要复查的Alpha列表
+        
+        Args:
+            region: 地区，为空时返回所有地区
+            columns: 需要返回的字段，默认返回全部字段
+        """
         try:
-            with self.get_connection() as conn:
-                where_clause = "WHERE recheck_flag = TRUE"
-                params = []
-                if region:
-                    where_clause += " AND region = ?"
-                    params.append(region)
-                
-                cursor = conn.execute(f"""
-                    SELECT alpha_id as id, type, author, instrument_type, region, universe, 
-                           delay, decay, neutralization, truncation, pasteurization, 
-                           unit_handling, nan_handling, language, visualization, code, 
-                           description, operator_count, date_created, date_submitted, 
-                           date_modified, name, favorite, hidden, color, category, 
-                           tags, classifications, grade, stage, status, pnl, book_size,
-                           long_count, short_count, turnover, returns, drawdown, margin,
-                           fitness, sharpe, start_date, checks, os, train, test, prod,
-                           competitions, themes, team, pyramids, aggressive_mode, 
-                           self_corr, prod_corr, recheck_flag, created_at
-                    FROM submitable_alphas 
-                    {where_clause}
-                    ORDER BY date_created DESC
-                """, params)
-                
-                columns = [description[0] for description in cursor.description]
-                rows = cursor.fetchall()
-                
-                # 转换为字典列表
-                result = []
-                for row in rows:
-                    alpha_dict = dict(zip(columns, row))
-                    
-                    # 处理复杂字段的JSON反序列化
-                    complex_fields = ['tags', 'classifications', 'checks', 'os', 'train', 'test', 'prod', 'competitions', 'themes', 'team', 'pyramids']
-                    for field in complex_fields:
-                        if field in alpha_dict and alpha_dict[field]:
-                            try:
-                                alpha_dict[field] = json.loads(alpha_dict[field])
-                            except (json.JSONDecodeError, TypeError):
-                                alpha_dict[field] = []
-                    
-                    result.append(alpha_dict)
-                
-                return result
-        except Exception as e:
-            print(f"获取复查Alpha列表失败: {e}")
+            where_clause = "WHERE recheck_flag = TRUE"
+            params = []
+            if region:
+                where_clause += " AND region = ?"
+                params.append(region)
+            
+            return self._query_alphas(where_clause, params, columns)
+        except Exception:
+            logger.exception("获取复查Alpha列表失败")
             return []
     
     def clear_recheck_flags(self, alpha_ids: List[str] = None) -> int:
@@ -389,8 +951,8 @@ class FactorDatabaseManager:
                     # 清除所有复查标记
                     cursor = conn.execute("UPDATE submitable_alphas SET recheck_flag = FALSE")
                 return cursor.rowcount
-        except Exception as e:
-            print(f"清除复查标记失败: {e}")
+        except Exception:
+            logger.exception("清除复查标记失败")
             return 0
     
     # ====================================================================
@@ -405,12 +967,12 @@ class FactorDatabaseManager:
     def get_config(self, key: str, default_value: str = None) -> Optional[str]:
         """获取配置值"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.execute("SELECT config_value FROM system_config WHERE config_key = ?", (key,))
                 result = cursor.fetchone()
                 return result[0] if result else default_value
-        except Exception as e:
-            print(f"获取配置失败: {e}")
+        except Exception:
+            logger.exception("获取配置失败")
             return default_value
     
     def set_config(self, key: str, value: str, description: str = None) -> bool:
@@ -422,8 +984,8 @@ class FactorDatabaseManager:
                     VALUES (?, ?, ?, datetime('now'))
                 """, (key, value, description))
                 return True
-        except Exception as e:
-            print(f"设置配置失败: {e}")
+        except Exception:
+            logger.exception("设置配置失败")
             return False
     
     def get_system_config(self, key: str, default_value: str = None) -> Optional[str]:
@@ -438,33 +1000,57 @@ class FactorDatabaseManager:
     # 统计和分析相关操作
     # ====================================================================
     
-    def get_system_stats(self) -> Dict[str, Any]:
-        """获取系统统计信息"""
+    def get_system_stats(self, include_breakdown: bool = True) -> Dict[str, Any]:
+        """获取系统统计信息
+        
+        Args:
+            include_breakdown: 是否同时返回按数据集分组的表达式统计
+        """
         try:
-            with self.get_connection() as conn:
-                # 获取各表记录数
+            with self._read_connection() as conn:
+                # 获取各表记录数：优先读取触发器维护的 system_overview_cache（O(1)），
+                # 未执行过 add_daily_submit_stats 迁移的数据库回退为一次合并的 COUNT 查询
                 stats = {}
                 
-                cursor = conn.execute("SELECT COUNT(*) FROM factor_expressions")
-                stats['total_expressions'] = cursor.fetchone()[0]
+                try:
+                    cursor = conn.execute("""
+                        SELECT table_name, record_count FROM system_overview_cache
+                        WHERE table_name IN ('factor_expressions', 'checked_alphas', 'submitable_alphas')
+                    """)
+                    counts = dict(cursor.fetchall())
+                except sqlite3.OperationalError:
+                    counts = {}
                 
-                cursor = conn.execute("SELECT COUNT(*) FROM checked_alphas")
-                stats['total_checked'] = cursor.fetchone()[0]
+                if len(counts) < 3:
+                    cursor = conn.execute("""
+                        SELECT
+                            (SELECT COUNT(*) FROM factor_expressions),
+                            (SELECT COUNT(*) FROM checked_alphas),
+                            (SELECT COUNT(*) FROM submitable_alphas)
+                    """)
+                    counts = dict(zip(('factor_expressions', 'checked_alphas', 'submitable_alphas'), cursor.fetchone()))
                 
-                cursor = conn.execute("SELECT COUNT(*) FROM submitable_alphas")
-                stats['total_submitable'] = cursor.fetchone()[0]
+                stats['total_expressions'] = counts['factor_expressions']
+                stats['total_checked'] = counts['checked_alphas']
+                stats['total_submitable'] = counts['submitable_alphas']
                 
                 # 获取各数据集统计
-                cursor = conn.execute("""
-                    SELECT dataset_id, region, step, COUNT(*) as count
-                    FROM factor_expressions 
-                    GROUP BY dataset_id, region, step
-                """)
-                stats['expression_breakdown'] = cursor.fetchall()
+                if include_breakdown:
+                    def load():
+                        cursor = conn.execute("""
+                            SELECT dataset_id, region, step, COUNT(*) as count
+                            FROM factor_expressions 
+                            GROUP BY dataset_id, region, step
+                        """)
+                        return cursor.fetchall()
+                    
+                    # 分组统计需扫描全部表达式，factor_expressions 未变化时复用上次结果
+                    breakdown = self._cached_read(conn, ('expression_breakdown',), 'factor_expressions', load)
+                    stats['expression_breakdown'] = list(breakdown)
                 
                 return stats
-        except Exception as e:
-            print(f"获取系统统计失败: {e}")
+        except Exception:
+            logger.exception("获取系统统计失败")
             return {}
     
     def cleanup_old_data(self, days: int = 30) -> int:
@@ -473,11 +1059,11 @@ class FactorDatabaseManager:
             with self.get_connection() as conn:
                 cursor = conn.execute("""
                     DELETE FROM checked_alphas 
-                    WHERE checked_at < datetime('now', '-{} days')
-                """.format(days))
+                    WHERE checked_at < datetime('now', ?)
+                """, (f'-{days} days',))
                 return cursor.rowcount
-        except Exception as e:
-            print(f"清理旧数据失败: {e}")
+        except Exception:
+            logger.exception("清理旧数据失败")
             return 0
     
     # ====================================================================
@@ -493,7 +1079,7 @@ class FactorDatabaseManager:
         :return: 统计数据字典
         """
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 # 使用日期和时区双条件精准查询
                 cursor = conn.execute("""
                     SELECT successful_submits, total_attempts, timezone, last_updated
@@ -521,8 +1107,8 @@ class FactorDatabaseManager:
                     'last_updated': None,
                     'remaining_quota': None
                 }
-        except Exception as e:
-            print(f"获取每日提交统计失败: {e}")
+        except Exception:
+            logger.exception("获取每日提交统计失败")
             return {
                 'date': date,
                 'successful_submits': 0,
@@ -533,6 +1119,22 @@ class FactorDatabaseManager:
             }
     
 
+    def _has_daily_stats_unique_key(self, conn: sqlite3.Connection) -> bool:
+        """daily_submit_stats 是否有 (date, timezone) 上的唯一约束或主键（UPSERT 的 ON CONFLICT 目标）
+        
+        确认存在后不再检查（迁移只会把旧表升级为有该约束的结构）；旧表每次调用时重新检查，迁移后即可切换
+        """
+        if not self._daily_stats_upsert:
+            cursor = conn.execute("""
+                SELECT 1 FROM pragma_index_list('daily_submit_stats') AS il
+                WHERE il."unique"
+                  AND (SELECT group_concat(name) FROM (
+                          SELECT name FROM pragma_index_info(il.name) ORDER BY seqno
+                      )) = 'date,timezone'
+            """)
+            self._daily_stats_upsert = cursor.fetchone() is not None
+        return self._daily_stats_upsert
+    
     def update_daily_submit_stats(self, date: str, successful_increment: int = 0, 
                                  attempt_increment: int = 0, timezone: str = 'UTC') -> bool:
         """
@@ -546,22 +1148,28 @@ class FactorDatabaseManager:
         """
         try:
             with self.get_connection() as conn:
-                # 使用 INSERT OR REPLACE 语句，确保查询时同时匹配日期和时区
+                if not self._has_daily_stats_unique_key(conn):
+                    # 尚未迁移的旧表只有 date UNIQUE，ON CONFLICT(date, timezone) 无法匹配约束，沿用原有写法
+                    conn.execute(DAILY_STATS_LEGACY_REPLACE_SQL, (
+                        date, date, timezone, successful_increment, date, timezone, attempt_increment, timezone
+                    ))
+                    return True
+                
+                # UPSERT：按(date, timezone)冲突时原地累加，只需一次索引查找，且不会删除重建行
+                # 新插入行的 last_updated 由列默认值 CURRENT_TIMESTAMP 写入
                 conn.execute("""
-                    INSERT OR REPLACE INTO daily_submit_stats 
-                    (date, successful_submits, total_attempts, timezone, last_updated)
-                    VALUES (
-                        ?,
-                        COALESCE((SELECT successful_submits FROM daily_submit_stats WHERE date = ? AND timezone = ?), 0) + ?,
-                        COALESCE((SELECT total_attempts FROM daily_submit_stats WHERE date = ? AND timezone = ?), 0) + ?,
-                        ?,
-                        datetime('now')
-                    )
-                """, (date, date, timezone, successful_increment, date, timezone, attempt_increment, timezone))
+                    INSERT INTO daily_submit_stats 
+                    (date, successful_submits, total_attempts, timezone)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(date, timezone) DO UPDATE SET
+                        successful_submits = successful_submits + excluded.successful_submits,
+                        total_attempts = total_attempts + excluded.total_attempts,
+                        last_updated = CURRENT_TIMESTAMP
+                """, (date, successful_increment, attempt_increment, timezone))
                 
                 return True
-        except Exception as e:
-            print(f"更新每日提交统计失败: {e}")
+        except Exception:
+            logger.exception("更新每日提交统计失败")
             return False
     
     def get_recent_daily_stats(self, days: int = 7) -> List[Dict[str, Any]]:
@@ -572,8 +1180,8 @@ class FactorDatabaseManager:
         :return: 统计数据列表
         """
         try:
-            with self.get_connection() as conn:
-                cursor = conn.execute("""
+            with self._read_connection() as conn:
+                return self._fetch_dicts(conn, """
                     SELECT date, successful_submits, total_attempts, timezone, last_updated,
                            CASE 
                                WHEN total_attempts > 0 
@@ -581,24 +1189,11 @@ class FactorDatabaseManager:
                                ELSE 0
                            END as success_rate
                     FROM daily_submit_stats 
-                    WHERE date >= date('now', '-{} days')
+                    WHERE date >= date('now', ?)
                     ORDER BY date DESC
-                """.format(days))
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        'date': row[0],
-                        'successful_submits': row[1],
-                        'total_attempts': row[2], 
-                        'timezone': row[3],
-                        'last_updated': row[4],
-                        'success_rate': row[5]
-                    })
-                
-                return results
-        except Exception as e:
-            print(f"获取最近每日统计失败: {e}")
+                """, (f'-{days} days',))
+        except Exception:
+            logger.exception("获取最近每日统计失败")
             return []
 
     def get_recent_daily_stats_by_timezone(self, days: int = 3, timezone: str = '-4') -> List[Dict[str, Any]]:
@@ -610,8 +1205,8 @@ class FactorDatabaseManager:
         :return: 统计数据列表
         """
         try:
-            with self.get_connection() as conn:
-                cursor = conn.execute("""
+            with self._read_connection() as conn:
+                return self._fetch_dicts(conn, """
                     SELECT date, successful_submits, total_attempts, timezone, last_updated,
                            CASE 
                                WHEN total_attempts > 0 
@@ -619,24 +1214,11 @@ class FactorDatabaseManager:
                                ELSE 0
                            END as success_rate
                     FROM daily_submit_stats 
-                    WHERE timezone = ? AND date >= date('now', '-{} days')
+                    WHERE timezone = ? AND date >= date('now', ?)
                     ORDER BY date DESC
-                """.format(days), (timezone,))
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        'date': row[0],
-                        'successful_submits': row[1],
-                        'total_attempts': row[2], 
-                        'timezone': row[3],
-                        'last_updated': row[4],
-                        'success_rate': row[5]
-                    })
-                
-                return results
-        except Exception as e:
-            print(f"获取最近每日统计失败: {e}")
+                """, (timezone, f'-{days} days'))
+        except Exception:
+            logger.exception("获取最近每日统计失败")
             return []
 
     def get_recent_factor_expressions_by_dataset(self, days: int = 3, target_timezone: str = 'UTC-4') -> List[Dict[str, Any]]:
@@ -648,7 +1230,7 @@ class FactorDatabaseManager:
         :return: 按日期和数据集分组的统计列表
         """
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 # 计算时区偏移小时数
                 if target_timezone.startswith('UTC'):
                     tz_offset = target_timezone[3:]  # 获取 '+8' 或 '-4'
@@ -661,40 +1243,24 @@ class FactorDatabaseManager:
                 else:
                     offset_hours = 0
                 
-                # 构建SQL查询，使用时区偏移调整日期
-                cursor = conn.execute("""
+                # 时区偏移和天数作为日期修饰符参数绑定，SQL文本固定，可复用已编译的语句
+                hours_modifier = f'{offset_hours:+d} hours'
+                days_modifier = f'-{days} days'
+                return self._fetch_dicts(conn, """
                     SELECT 
-                        date(created_at, '{} hours') as local_date,
+                        date(created_at, ?) as date,
                         dataset_id,
                         region,
                         step,
-                        COUNT(*) as new_expressions
+                        COUNT(*) as new_expressions,
+                        ? as timezone
                     FROM factor_expressions 
-                    WHERE date(created_at, '{} hours') >= date('now', '{} hours', '-{} days')
-                    GROUP BY date(created_at, '{} hours'), dataset_id, region, step
-                    ORDER BY local_date DESC, dataset_id, region, step
-                """.format(
-                    '+' + str(offset_hours) if offset_hours >= 0 else str(offset_hours),
-                    '+' + str(offset_hours) if offset_hours >= 0 else str(offset_hours),
-                    '+' + str(offset_hours) if offset_hours >= 0 else str(offset_hours),
-                    days,
-                    '+' + str(offset_hours) if offset_hours >= 0 else str(offset_hours)
-                ))
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        'date': row[0],
-                        'dataset_id': row[1],
-                        'region': row[2],
-                        'step': row[3],
-                        'new_expressions': row[4],
-                        'timezone': target_timezone
-                    })
-                
-                return results
-        except Exception as e:
-            print(f"获取最近因子表达式统计失败: {e}")
+                    WHERE date(created_at, ?) >= date('now', ?, ?)
+                    GROUP BY date(created_at, ?), dataset_id, region, step
+                    ORDER BY date DESC, dataset_id, region, step
+                """, (hours_modifier, target_timezone, hours_modifier, hours_modifier, days_modifier, hours_modifier))
+        except Exception:
+            logger.exception("获取最近因子表达式统计失败")
             return []
 
     # ====================================================================
@@ -725,10 +1291,18 @@ class FactorDatabaseManager:
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (expression, dataset_id, region, step, failure_reason, error_details))
                 return True
-        except Exception as e:
-            print(f"添加失败表达式记录失败: {e}")
+        except Exception:
+            logger.exception("添加失败表达式记录失败")
             return False
     
+    def _failed_expressions_query(self, dataset_id: str, region: str, step: int,
+                                  failure_reason: str, limit: int) -> Tuple[str, List[Any]]:
+        """按启用的过滤条件选取预生成的SQL，参数顺序与条件顺序一致"""
+        flags = (bool(dataset_id), bool(region), step is not None, bool(failure_reason))
+        values = (dataset_id, region, step, f"%{failure_reason}%")
+        params = [value for value, enabled in zip(values, flags) if enabled]
+        return self._failed_expressions_queries[flags], params + [limit]
+    
     def get_failed_expressions(self, dataset_id: str = None, region: str = None, 
                              step: int = None, failure_reason: str = None,
                              limit: int = 100) -> List[Dict[str, Any]]:
@@ -746,53 +1320,28 @@ class FactorDatabaseManager:
             List[Dict]: 失败表达式记录列表
         """
         try:
-            with self.get_connection() as conn:
-                # 构建WHERE条件
-                conditions = []
-                params = []
-                
-                if dataset_id:
-                    conditions.append("dataset_id = ?")
-                    params.append(dataset_id)
-                if region:
-                    conditions.append("region = ?")
-                    params.append(region)
-                if step is not None:
-                    conditions.append("step = ?")
-                    params.append(step)
-                if failure_reason:
-                    conditions.append("failure_reason LIKE ?")
-                    params.append(f"%{failure_reason}%")
-                
-                where_clause = ""
-                if conditions:
-                    where_clause = "WHERE " + " AND ".join(conditions)
-                
-                cursor = conn.execute(f"""
-                    SELECT id, expression, dataset_id, region, step, failure_reason, 
-                           error_details, created_at
-                    FROM failed_expressions 
-                    {where_clause}
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                """, params + [limit])
-                
-                results = []
-                for row in cursor.fetchall():
-                    results.append({
-                        'id': row[0],
-                        'expression': row[1],
-                        'dataset_id': row[2],
-                        'region': row[3],
-                        'step': row[4],
-                        'failure_reason': row[5],
-                        'error_details': row[6],
-                        'created_at': row[7]
-                    })
-                
-                return results
-        except Exception as e:
-            print(f"获取失败表达式列表失败: {e}")
+            sql, params = self._failed_expressions_query(dataset_id, region, step, failure_reason, limit)
+            with self._read_connection() as conn:
+                return self._fetch_dicts(conn, sql, params)
+        except Exception:
+            logger.exception("获取失败表达式列表失败")
+            return []
+    
+    def get_failed_expressions_raw(self, dataset_id: str = None, region: str = None,
+                                   step: int = None, failure_reason: str = None,
+                                   limit: int = 100) -> List[Tuple]:
+        """
+        获取失败的因子表达式列表（元组形式，不构造字典）
+        
+        参数同 get_failed_expressions，元组字段顺序见 FAILED_EXPRESSION_COLUMNS，
+        适合直接构造DataFrame等批量处理场景
+        """
+        try:
+            sql, params = self._failed_expressions_query(dataset_id, region, step, failure_reason, limit)
+            with self._read_connection() as conn:
+                return conn.execute(sql, params).fetchall()
+        except Exception:
+            logger.exception("获取失败表达式列表失败")
             return []
     
     def get_failure_stats(self) -> Dict[str, Any]:
@@ -803,75 +1352,25 @@ class FactorDatabaseManager:
             Dict: 包含各种失败统计的字典
         """
         try:
-            with self.get_connection() as conn:
-                # 总失败记录数
-                cursor = conn.execute("SELECT COUNT(*) FROM failed_expressions")
-                total_failures = cursor.fetchone()[0]
-                
-                # 唯一失败表达式数
-                cursor = conn.execute("SELECT COUNT(DISTINCT expression) FROM failed_expressions")
-                unique_failed_expressions = cursor.fetchone()[0]
-                
-                # 按失败原因统计
-                cursor = conn.execute("""
-                    SELECT failure_reason, COUNT(*) as count, 
-                           COUNT(DISTINCT expression) as unique_count,
-                           COUNT(DISTINCT dataset_id) as affected_datasets
-                    FROM failed_expressions
-                    WHERE failure_reason IS NOT NULL
-                    GROUP BY failure_reason
-                    ORDER BY count DESC
-                    LIMIT 10
-                """)
-                failure_reasons = [{'reason': row[0], 'count': row[1], 
-                                  'unique_expressions': row[2], 'affected_datasets': row[3]} 
-                                 for row in cursor.fetchall()]
-                
-                # 按数据集统计
-                cursor = conn.execute("""
-                    SELECT dataset_id, region, step, COUNT(*) as count,
-                           COUNT(DISTINCT expression) as unique_expressions,
-                           COUNT(DISTINCT failure_reason) as failure_types
-                    FROM failed_expressions
-                    GROUP BY dataset_id, region, step
-                    ORDER BY count DESC
-                    LIMIT 10
-                """)
-                dataset_failures = [{'dataset_id': row[0], 'region': row[1], 'step': row[2], 
-                                   'count': row[3], 'unique_expressions': row[4], 'failure_types': row[5]} 
-                                  for row in cursor.fetchall()]
-                
-                # 最近24小时失败数
-                cursor = conn.execute("""
-                    SELECT COUNT(*) 
-                    FROM failed_expressions
-                    WHERE created_at >= datetime('now', '-1 day')
-                """)
-                recent_failures = cursor.fetchone()[0]
-                
-                # 表达式长度统计
-                cursor = conn.execute("""
-                    SELECT AVG(LENGTH(expression)) as avg_length,
-                           MIN(LENGTH(expression)) as min_length,
-                           MAX(LENGTH(expression)) as max_length
-                    FROM failed_expressions
-                """)
-                length_stats = cursor.fetchone()
+            with self._read_connection() as conn:
+                row = conn.execute(FAILURE_STATS_SQL).fetchone()
+                (total_failures, unique_failed_expressions, recent_failures,
+                 avg_length, min_length, max_length, failure_reasons, dataset_failures) = row
                 
                 return {
                     'total_failures': total_failures,
                     'unique_failed_expressions': unique_failed_expressions,
                     'recent_24h_failures': recent_failures,
-                    'failure_by_reason': failure_reasons,
-                    'failure_by_dataset': dataset_failures,
+                    'failure_by_reason': json_loads(failure_reasons),
+                    'failure_by_dataset': json_loads(dataset_failures),
                     'expression_length_stats': {
-                        'avg_length': round(length_stats[0], 2) if length_stats[0] else 0,
-                        'min_length': length_stats[1] or 0,
-                        'max_length': length_stats[2] or 0
+                        'avg_length': round(avg_length, 2) if avg_length else 0,
+                        'min_length': min_length or 0,
+                        'max_length': max_length or 0
                     }
                 }
-        except Exception as e:
-            print(f"获取失败统计信息失败: {e}")
+        except Exception:
+            logger.exception("获取失败统计信息失败")
             return {}
     
     def cleanup_old_failed_expressions(self, days: int = 30) -> int:
@@ -888,11 +1387,11 @@ class FactorDatabaseManager:
             with self.get_connection() as conn:
                 cursor = conn.execute("""
                     DELETE FROM failed_expressions 
-                    WHERE created_at < datetime('now', '-{} days')
-                """.format(days))
+                    WHERE created_at < datetime('now', ?)
+                """, (f'-{int(days)} days',))
                 return cursor.rowcount
-        except Exception as e:
-            print(f"清理旧失败表达式记录失败: {e}")
+        except Exception:
+            logger.exception("清理旧失败表达式记录失败")
             return 0
 
 # 全局数据库管理器实例
@@ -910,19 +1409,17 @@ def write_completed_alpha(alpha_id: str, dataset_id: str, region: str, step: int
     """写入已完成的Alpha（替换文件写入）"""
     return db_manager.add_checked_alpha(alpha_id, dataset_id, region, step)
 
-def get_submitable_alphas_df() -> pd.DataFrame:
+def get_submitable_alphas_df() -> 'pd.DataFrame':
     """获取可提交因子DataFrame（替换CSV读取）"""
     return db_manager.get_submitable_alphas()
 
-def add_submitable_alpha_df(alpha_df: pd.DataFrame) -> bool:
+def add_submitable_alpha_df(alpha_df: 'pd.DataFrame') -> bool:
     """添加可提交因子DataFrame（替换CSV写入）"""
     try:
-        for _, row in alpha_df.iterrows():
-            alpha_data = row.to_dict()
-            db_manager.add_submitable_alpha(alpha_data)
-        return True
-    except Exception as e:
-        print(f"添加可提交因子DataFrame失败: {e}")
+        rows = alpha_df.to_dict('records')
+        return db_manager.add_submitable_alphas_bulk(rows) == len(rows)
+    except Exception:
+        logger.exception("添加可提交因子DataFrame失败")
         return False
 
 def remove_submitted_alphas(alpha_ids: List[str]) -> int:
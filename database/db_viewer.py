@@ -15,12 +15,44 @@ from datetime import datetime, timedelta
 # 添加src目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-try:
-    from config import ROOT_PATH
-except ImportError:
-    ROOT_PATH = os.path.dirname(os.path.dirname(__file__))
+from database.db_manager import FactorDatabaseManager, build_filter_templates
 
-from database.db_manager import FactorDatabaseManager
+# 分块读取可提交因子时每块的行数
+SUBMITABLE_CHUNK_SIZE = 1000
+# 自定义查询预览的行数
+CUSTOM_QUERY_PREVIEW_ROWS = 20
+
+# 搜索/列表查询的SQL模板：按启用的过滤条件组合预先生成，同一组合始终使用同一SQL文本
+SEARCH_EXPRESSIONS_QUERIES = build_filter_templates(
+    "SELECT id, expression, dataset_id, region, step, created_at FROM factor_expressions",
+    ("expression LIKE ?", "dataset_id = ?", "region = ?", "step = ?"),
+    "ORDER BY created_at DESC LIMIT ?",
+)
+CHECKED_ALPHAS_QUERIES = build_filter_templates(
+    "SELECT alpha_id, dataset_id, region, step, checked_at FROM checked_alphas",
+    ("dataset_id = ?", "region = ?", "step = ?"),
+    "ORDER BY checked_at DESC LIMIT ?",
+)
+
+# 分析报告中统计的常用操作符
+ANALYSIS_OPERATORS = ['ts_rank', 'ts_mean', 'ts_sum', 'rank', 'winsorize', 'ts_zscore', 'ts_delta']
+# 用 instr 做精确子串匹配：比 LIKE 的模式匹配开销小，且不会把操作符名中的 '_' 当作通配符
+OPERATOR_USAGE_SQL = (
+    "SELECT " + ", ".join("SUM(instr(expression, ?) > 0)" for _ in ANALYSIS_OPERATORS)
+    + " FROM factor_expressions"
+)
+
+def query_text_frame(conn, sql: str, params: List[Any]) -> pd.DataFrame:
+    """执行查询，返回保留原始Python值的DataFrame（dtype=object）
+
+    NULL 保持为 None、整数不会因为缺失值被提升为浮点，整列 map(str) 得到的文本与逐行 f-string 输出一致
+    """
+    cursor = conn.execute(sql, params)
+    return pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description], dtype=object)
+
+def as_text(column: pd.Series) -> pd.Series:
+    """将一列转换为显示文本，缺失值显示为 None（与逐行 f-string 输出一致，而不是 nan）"""
+    return column.astype(object).where(column.notna(), None).map(str)
 
 class DatabaseViewer:
     """数据库查看器"""
@@ -86,53 +118,28 @@ class DatabaseViewer:
         
         try:
             with self.db_manager.get_connection() as conn:
-                # 构建查询条件
-                conditions = []
-                params = []
-                
-                if keyword:
-                    conditions.append("expression LIKE ?")
-                    params.append(f"%{keyword}%")
-                
-                if dataset_id:
-                    conditions.append("dataset_id = ?")
-                    params.append(dataset_id)
-                    
-                if region:
-                    conditions.append("region = ?")
-                    params.append(region)
-                    
-                if step is not None:
-                    conditions.append("step = ?")
-                    params.append(step)
+                # 按启用的过滤条件选取预生成的SQL，参数顺序与条件顺序一致
+                flags = (bool(keyword), bool(dataset_id), bool(region), step is not None)
+                values = (f"%{keyword}%", dataset_id, region, step)
+                params = [value for value, enabled in zip(values, flags) if enabled] + [limit]
+                sql = SEARCH_EXPRESSIONS_QUERIES[flags]
                 
-                where_clause = " AND ".join(conditions) if conditions else "1=1"
-                
-                sql = f"""
-                    SELECT id, expression, dataset_id, region, step, created_at
-                    FROM factor_expressions 
-                    WHERE {where_clause}
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                """
-                params.append(limit)
+                df = query_text_frame(conn, sql, params)
                 
-                cursor = conn.execute(sql, params)
-                results = cursor.fetchall()
-                
-                if not results:
+                if df.empty:
                     print("❌ 未找到匹配的表达式")
                     return
                 
-                print(f"📋 找到 {len(results)} 条结果:")
+                print(f"📋 找到 {len(df)} 条结果:")
                 print()
                 
-                for i, (id, expression, ds_id, reg, stp, created) in enumerate(results, 1):
-                    print(f"{i:2d}. ID: {id}")
-                    print(f"    表达式: {expression}")
-                    print(f"    数据集: {ds_id}_{reg}_{stp}step")
-                    print(f"    创建时间: {created}")
-                    print()
+                # 整列拼接出每条结果的显示文本，一次输出
+                numbers = pd.Series(range(1, len(df) + 1)).map('{:2d}'.format)
+                blocks = (numbers + ". ID: " + df['id'].map(str)
+                          + "\n    表达式: " + df['expression'].map(str)
+                          + "\n    数据集: " + df['dataset_id'].map(str) + "_" + df['region'].map(str) + "_" + df['step'].map(str) + "step"
+                          + "\n    创建时间: " + df['created_at'].map(str) + "\n")
+                print("\n".join(blocks))
                     
         except Exception as e:
             print(f"❌ 搜索失败: {e}")
@@ -144,57 +151,29 @@ class DatabaseViewer:
         
         try:
             with self.db_manager.get_connection() as conn:
-                # 构建查询条件
-                conditions = []
-                params = []
-                
-                if dataset_id:
-                    conditions.append("dataset_id = ?")
-                    params.append(dataset_id)
-                    
-                if region:
-                    conditions.append("region = ?")
-                    params.append(region)
-                    
-                if step is not None:
-                    conditions.append("step = ?")
-                    params.append(step)
+                # 按启用的过滤条件选取预生成的SQL，参数顺序与条件顺序一致
+                flags = (bool(dataset_id), bool(region), step is not None)
+                values = (dataset_id, region, step)
+                params = [value for value, enabled in zip(values, flags) if enabled] + [limit]
+                sql = CHECKED_ALPHAS_QUERIES[flags]
                 
-                where_clause = " AND ".join(conditions) if conditions else "1=1"
-                
-                sql = f"""
-                    SELECT alpha_id, dataset_id, region, step, checked_at
-                    FROM checked_alphas 
-                    WHERE {where_clause}
-                    ORDER BY checked_at DESC
-                    LIMIT ?
-                """
-                params.append(limit)
+                df = query_text_frame(conn, sql, params)
                 
-                cursor = conn.execute(sql, params)
-                results = cursor.fetchall()
-                
-                if not results:
+                if df.empty:
                     print("❌ 未找到已检查的因子")
                     return
                 
-                print(f"📋 最近检查的 {len(results)} 个因子:")
+                print(f"📋 最近检查的 {len(df)} 个因子:")
                 print()
                 
-                # 按数据集分组显示
-                grouped = {}
-                for alpha_id, ds_id, reg, stp, checked in results:
-                    key = f"{ds_id}_{reg}_{stp}step"
-                    if key not in grouped:
-                        grouped[key] = []
-                    grouped[key].append((alpha_id, checked))
-                
-                for key, alphas in grouped.items():
+                # 按数据集分组显示，每组的行文本整列拼接后一次输出
+                df['key'] = df['dataset_id'].map(str) + "_" + df['region'].map(str) + "_" + df['step'].map(str) + "step"
+                df['line'] = "  - " + df['alpha_id'].map(str) + " (检查时间: " + df['checked_at'].map(str) + ")"
+                for key, group in df.groupby('key', sort=False):
                     print(f"📊 {key}:")
-                    for alpha_id, checked in alphas[:10]:  # 每组最多显示10个
-                        print(f"  - {alpha_id} (检查时间: {checked})")
-                    if len(alphas) > 10:
-                        print(f"  ... 还有 {len(alphas) - 10} 个")
+                    print("\n".join(group['line'].head(10)))  # 每组最多显示10个
+                    if len(group) > 10:
+                        print(f"  ... 还有 {len(group) - 10} 个")
                     print()
                     
         except Exception as e:
@@ -206,28 +185,26 @@ class DatabaseViewer:
         print("="*50)
         
         try:
-            df = self.db_manager.get_submitable_alphas()
+            with self.db_manager.get_connection() as conn:
+                total = conn.execute("SELECT COUNT(*) FROM submitable_alphas").fetchone()[0]
             
-            if df.empty:
+            if total == 0:
                 print("❌ 当前没有可提交的因子")
                 return
             
-            print(f"📋 共有 {len(df)} 个可提交因子:")
+            print(f"📋 共有 {total} 个可提交因子:")
             print()
             
-            # 显示关键信息
-            display_columns = ['alpha_id', 'region', 'universe', 'self_corr', 'prod_corr']
-            available_columns = [col for col in display_columns if col in df.columns]
-            
-            for i, row in df.iterrows():
-                print(f"{i+1:2d}. Alpha ID: {row.get('id', 'N/A')}")
-                if 'region' in row and 'universe' in row:
-                    print(f"    市场: {row['region']}-{row['universe']}")
-                if 'self_corr' in row:
-                    print(f"    自相关: {row['self_corr']:.3f}")
-                if 'prod_corr' in row:
-                    print(f"    生产相关: {row['prod_corr']:.3f}")
-                print()
+            # 分块读取，每块整列拼接出显示文本后一次输出，内存占用与因子总数无关
+            start = 1
+            for chunk in self.db_manager.iter_submitable_alphas(chunksize=SUBMITABLE_CHUNK_SIZE):
+                numbers = pd.Series(range(start, start + len(chunk)), index=chunk.index).map('{:2d}'.format)
+                blocks = (numbers + ". Alpha ID: " + as_text(chunk['id'])
+                          + "\n    市场: " + as_text(chunk['region']) + "-" + as_text(chunk['universe'])
+                          + "\n    自相关: " + chunk['self_corr'].astype(float).map('{:.3f}'.format)
+                          + "\n    生产相关: " + chunk['prod_corr'].astype(float).map('{:.3f}'.format) + "\n")
+                print("\n".join(blocks))
+                start += len(chunk)
                 
         except Exception as e:
             print(f"❌ 查询失败: {e}")
@@ -279,12 +256,18 @@ class DatabaseViewer:
             print(f"  - 每日限额: {daily_limit} 个/天" + (" (无限制)" if daily_limit == 0 else ""))
             print(f"  - 时区设置: {limit_timezone}")
             
+            # 最近7天的统计由一次按日期范围的查询取得，今日状态和历史表格共用
+            recent_stats = self.db_manager.get_recent_daily_stats(7)
+            
             if daily_limit > 0:
                 # 获取当前日期
                 current_date = get_current_date_with_timezone(limit_timezone)
                 
-                # 获取今日统计
-                daily_stats = self.db_manager.get_daily_submit_stats(current_date, limit_timezone)
+                # 获取今日统计：通常已包含在最近7天的结果中，找不到时再单独查询
+                daily_stats = next((stat for stat in recent_stats
+                                    if stat['date'] == current_date and stat['timezone'] == limit_timezone), None)
+                if daily_stats is None:
+                    daily_stats = self.db_manager.get_daily_submit_stats(current_date, limit_timezone)
                 today_successful = daily_stats['successful_submits']
                 today_attempts = daily_stats['total_attempts']
                 remaining_quota = daily_limit - today_successful
@@ -305,7 +288,6 @@ class DatabaseViewer:
             
             # 获取最近几天的统计
             print(f"\n📈 最近7天统计:")
-            recent_stats = self.db_manager.get_recent_daily_stats(7)
             if recent_stats:
                 print(f"{'日期':>12} {'成功':>6} {'尝试':>6} {'成功率':>8} {'剩余配额':>8}")
                 print("-" * 50)
@@ -333,14 +315,22 @@ class DatabaseViewer:
         try:
             with self.db_manager.get_connection() as conn:
                 if sql.strip().upper().startswith('SELECT'):
-                    df = pd.read_sql_query(sql, conn)
-                    if df.empty:
+                    # 只取预览所需的行（多取1行用于判断是否还有更多结果），不读取完整结果集
+                    cursor = conn.execute(sql)
+                    rows = cursor.fetchmany(CUSTOM_QUERY_PREVIEW_ROWS + 1)
+                    if not rows:
                         print("❌ 查询结果为空")
                     else:
-                        print(f"📊 查询结果 ({len(df)} 行):")
-                        print(df.to_string(index=False, max_rows=20))
-                        if len(df) > 20:
-                            print(f"... 还有 {len(df) - 20} 行")
+                        has_more = len(rows) > CUSTOM_QUERY_PREVIEW_ROWS
+                        rows = rows[:CUSTOM_QUERY_PREVIEW_ROWS]
+                        df = pd.DataFrame(rows, columns=[column[0] for column in cursor.description])
+                        if has_more:
+                            print(f"📊 查询结果 (前 {len(rows)} 行):")
+                        else:
+                            print(f"📊 查询结果 ({len(rows)} 行):")
+                        print(df.to_string(index=False))
+                        if has_more:
+                            print("... 还有更多行（可在SQL中使用 LIMIT/OFFSET 分页查看）")
                 else:
                     cursor = conn.execute(sql)
                     print(f"✅ 查询执行成功，影响 {cursor.rowcount} 行")
@@ -386,7 +376,10 @@ def generate_analysis_report(viewer: DatabaseViewer):
                 ORDER BY total_count DESC
             """)
             
+            # 表达式总数由各分组计数相加得到，后续各节的占比共用，不再单独 COUNT(*)
+            total_expressions = 0
             for dataset_id, region, step, count, first, last in cursor.fetchall():
+                total_expressions += count
                 print(f"  - {dataset_id}_{region}_{step}step: {count:,} 条")
                 print(f"    首次创建: {first}")
                 print(f"    最近创建: {last}")
@@ -415,6 +408,7 @@ def generate_analysis_report(viewer: DatabaseViewer):
             
             # 3. 表达式复杂度分析
             print(f"\n🧮 表达式复杂度分析:")
+            # GROUP BY 与 idx_expressions_length 的索引表达式一致，按索引顺序扫描
             cursor = conn.execute("""
                 SELECT 
                     LENGTH(expression) as expr_length,
@@ -427,29 +421,28 @@ def generate_analysis_report(viewer: DatabaseViewer):
             
             lengths = cursor.fetchall()
             if lengths:
-                total_expressions = sum(count for _, count in lengths)
+                # 占比以所列前10种长度的合计为分母（与原报告一致），不是表达式总数
+                listed_total = sum(count for _, count in lengths)
                 print(f"  表达式长度分布 (前10种):")
                 for length, count in lengths:
-                    percentage = count * 100.0 / total_expressions
+                    percentage = count * 100.0 / listed_total
                     print(f"    {length} 字符: {count:,} 条 ({percentage:.1f}%)")
             
             # 4. 常用操作符分析
             print(f"\n🔧 常用操作符分析:")
-            operators = ['ts_rank', 'ts_mean', 'ts_sum', 'rank', 'winsorize', 'ts_zscore', 'ts_delta']
-            
-            for op in operators:
-                cursor = conn.execute("SELECT COUNT(*) FROM factor_expressions WHERE expression LIKE ?", (f"%{op}%",))
-                count = cursor.fetchone()[0]
-                cursor = conn.execute("SELECT COUNT(*) FROM factor_expressions")
-                total = cursor.fetchone()[0]
-                percentage = count * 100.0 / total if total > 0 else 0
+            # 所有操作符的使用次数在同一次扫描中统计
+            counts = conn.execute(OPERATOR_USAGE_SQL, ANALYSIS_OPERATORS).fetchone()
+            for op, count in zip(ANALYSIS_OPERATORS, counts):
+                count = count or 0
+                percentage = count * 100.0 / total_expressions if total_expressions > 0 else 0
                 print(f"    {op}: {count:,} 次使用 ({percentage:.1f}%)")
             
-            # 5. 数据库文件大小
-            db_path = os.path.join(ROOT_PATH, 'database', 'factors.db')
-            if os.path.exists(db_path):
-                size_mb = os.path.getsize(db_path) / 1024 / 1024
-                print(f"\n💾 数据库文件大小: {size_mb:.1f} MB")
+            # 5. 数据库文件大小：由当前连接的页数×页大小得到（含WAL中已提交的页），
+            # 不依赖硬编码的数据库路径
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            size_mb = page_count * page_size / 1024 / 1024
+            print(f"\n💾 数据库文件大小: {size_mb:.1f} MB")
             
     except Exception as e:
         print(f"❌ 分析报告生成失败: {e}")
@@ -7,9 +7,12 @@
 
 import os
 import sys
+import itertools
+import threading
 import sqlite3
-import pandas as pd
+import csv
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -18,27 +21,113 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from config import RECORDS_PATH, ROOT_PATH
 
+# orjson 为可选依赖：已安装时用于序列化JSON，否则回退到json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 流式导出时每次从游标取出的行数
+EXPORT_FETCH_SIZE = 50000
+# 导出文件的写缓冲区大小
+EXPORT_BUFFER_SIZE = 1 << 20
+# 每次拼接写入文件的行数
+EXPORT_WRITE_BATCH = 10000
+# 可提交因子导出时每次从游标取出的行数
+SUBMITABLE_EXPORT_CHUNK_SIZE = 50000
+
+def _dump_json_bytes(obj) -> bytes:
+    """序列化为缩进2格、以换行结尾的UTF-8 JSON（非ASCII字符不转义）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, indent=2, ensure_ascii=False) + '\n').encode('utf-8')
+
 class FactorDataExporter:
     def __init__(self, db_path='database/factors.db'):
         """初始化导出器"""
         self.db_path = os.path.join(ROOT_PATH, db_path)
         self.records_path = RECORDS_PATH
+        # 导出目录只构造一次，各文件路径由其拼接
+        self._records_dir = Path(self.records_path)
         self.conn = None
+        self._local = threading.local()
         
         # 确保导出目录存在
         os.makedirs(self.records_path, exist_ok=True)
         
+    def _open_connection(self) -> sqlite3.Connection:
+        """打开一个按导出场景调优的数据库连接"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        # 导出为只读的大表顺序扫描：大页缓存让B树内部页在多次ORDER BY扫描间保持常驻，
+        # mmap省去内核到用户态的拷贝；query_only 防止导出过程误写数据库
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA cache_size = -262144;
+            PRAGMA mmap_size = 1073741824;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA query_only = ON;
+        """)
+        return conn
+    
     def connect_db(self):
         """连接数据库"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn = self._open_connection()
             print(f"✅ 成功连接数据库: {self.db_path}")
             return True
         except Exception as e:
             print(f"❌ 数据库连接失败: {e}")
             return False
+    
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程使用的连接：并行导出的工作线程使用各自的连接，否则使用主连接"""
+        return getattr(self._local, 'conn', None) or self.conn
+    
+    def _run_with_own_connection(self, export_method):
+        """在工作线程中用独立连接执行一个导出方法（WAL模式下多个读连接可并发扫描）"""
+        self._local.conn = self._open_connection()
+        try:
+            export_method()
+        finally:
+            self._local.conn.close()
+            self._local.conn = None
             
+    def _stream_rows_to_files(self, cursor, filename_template: str) -> dict:
+        """将 (dataset_id, region, step, value) 行按文件分组流式写出
+        
+        查询已按 dataset_id, region, step 排序，同一文件的行在结果中连续，
+        用 itertools.groupby 逐组写出：每个文件打开一次、写完即关闭，不保留全部数据。
+        
+        Returns:
+            dict: 文件名 -> 写入行数（写入失败的文件不计入）
+        """
+        rows = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(EXPORT_FETCH_SIZE), []))
+        counts = {}
+        for (dataset_id, region, step), group in itertools.groupby(rows, key=lambda row: row[:3]):
+            filename = filename_template.format(dataset_id=dataset_id, region=region.lower(), step=step)
+            # 地区仅大小写不同的分组对应同一文件，且在排序结果中不相邻，再次出现时追加写入
+            mode = 'ab' if filename in counts else 'wb'
+            try:
+                with open(self._records_dir / filename, mode, buffering=EXPORT_BUFFER_SIZE) as f:
+                    # 攒满一批再拼接编码后整体写入，避免逐行write
+                    count = 0
+                    lines = []
+                    for row in group:
+                        lines.append(row[3])
+                        if len(lines) >= EXPORT_WRITE_BATCH:
+                            f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                            count += len(lines)
+                            lines.clear()
+                    if lines:
+                        f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                        count += len(lines)
+                counts[filename] = counts.get(filename, 0) + count
+            except OSError as e:
+                print(f"❌ 导出文件 {filename} 失败: {e}")
+        return counts
+    
     def export_factor_expressions(self):
         """导出因子表达式数据"""
         print("\n🔄 开始导出因子表达式数据...")
@@ -46,36 +135,19 @@ class FactorDataExporter:
         
         try:
             # 查询所有表达式数据，按数据集分组
-            cursor = self.conn.execute("""
+            # 排序键与索引 idx_expressions_partition_time 一致，按索引顺序扫描，无需排序
+            cursor = self._get_conn().execute("""
                 SELECT dataset_id, region, step, expression 
                 FROM factor_expressions 
                 ORDER BY dataset_id, region, step, created_at
             """)
             
-            # 按文件分组数据
-            file_groups = {}
-            for row in cursor.fetchall():
-                dataset_id, region, step, expression = row
-                filename = f"{dataset_id}_{region.lower()}_{step}step_simulated_alpha_expression.txt"
-                
-                if filename not in file_groups:
-                    file_groups[filename] = []
-                file_groups[filename].append(expression)
-            
-            # 写入文件
-            for filename, expressions in file_groups.items():
-                file_path = os.path.join(self.records_path, filename)
-                try:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        for expression in expressions:
-                            f.write(expression + '\n')
-                    
-                    count = len(expressions)
-                    total_exported += count
-                    print(f"✅ {filename}: 导出 {count} 条表达式")
-                    
-                except Exception as e:
-                    print(f"❌ 导出文件 {filename} 失败: {e}")
+            # 按文件分组流式写出
+            counts = self._stream_rows_to_files(
+                cursor, "{dataset_id}_{region}_{step}step_simulated_alpha_expression.txt")
+            for filename, count in counts.items():
+                total_exported += count
+                print(f"✅ {filename}: 导出 {count} 条表达式")
             
             print(f"📊 因子表达式导出完成，总计: {total_exported} 条")
             
@@ -89,36 +161,19 @@ class FactorDataExporter:
         
         try:
             # 查询所有已检查数据，按数据集分组
-            cursor = self.conn.execute("""
+            # 排序键与覆盖索引 idx_checked_partition_checked 一致，按索引顺序扫描，无需排序
+            cursor = self._get_conn().execute("""
                 SELECT dataset_id, region, step, alpha_id 
                 FROM checked_alphas 
                 ORDER BY dataset_id, region, step, checked_at
             """)
             
-            # 按文件分组数据
-            file_groups = {}
-            for row in cursor.fetchall():
-                dataset_id, region, step, alpha_id = row
-                filename = f"{dataset_id}_{region.lower()}_{step}step_checked_alpha_id.txt"
-                
-                if filename not in file_groups:
-                    file_groups[filename] = []
-                file_groups[filename].append(alpha_id)
-            
-            # 写入文件
-            for filename, alpha_ids in file_groups.items():
-                file_path = os.path.join(self.records_path, filename)
-                try:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        for alpha_id in alpha_ids:
-                            f.write(alpha_id + '\n')
-                    
-                    count = len(alpha_ids)
-                    total_exported += count
-                    print(f"✅ {filename}: 导出 {count} 个Alpha ID")
-                    
-                except Exception as e:
-                    print(f"❌ 导出文件 {filename} 失败: {e}")
+            # 按文件分组流式写出
+            counts = self._stream_rows_to_files(
+                cursor, "{dataset_id}_{region}_{step}step_checked_alpha_id.txt")
+            for filename, count in counts.items():
+                total_exported += count
+                print(f"✅ {filename}: 导出 {count} 个Alpha ID")
             
             print(f"📊 已检查因子导出完成，总计: {total_exported} 条")
             
@@ -130,51 +185,44 @@ class FactorDataExporter:
         print("\n🔄 开始导出可提交因子数据...")
         
         try:
-            # 查询所有可提交因子数据
-            df = pd.read_sql_query("""
-                SELECT * FROM submitable_alphas 
+            csv_path = self._records_dir / 'submitable_alpha.csv'
+            complex_fields = {'tags', 'checks', 'os', 'train', 'test', 'prod', 
+                              'competitions', 'themes', 'team', 'pyramids', 'classifications'}
+            conn = self._get_conn()
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(submitable_alphas)")]
+            
+            # 复杂字段在库中已是JSON字符串，原样导出，不再解析后重新序列化；空值/空串导出为空列表
+            select_list = ', '.join(
+                f"CASE WHEN {col} IS NULL OR {col} = '' THEN '[]' ELSE {col} END" if col in complex_fields else col
+                for col in columns
+            )
+            cursor = conn.execute(f"""
+                SELECT {select_list} FROM submitable_alphas 
                 ORDER BY created_at
-            """, self.conn)
+            """)
             
-            if df.empty:
+            rows = cursor.fetchmany(SUBMITABLE_EXPORT_CHUNK_SIZE)
+            if not rows:
                 print("⚠️  数据库中没有可提交因子数据")
                 return
             
             # 转换列名：下划线转驼峰（反向映射）
-            column_mapping = {}
-            for col in df.columns:
-                # 将下划线命名转换为驼峰命名
-                camel_case = ''.join(word.capitalize() if i > 0 else word for i, word in enumerate(col.split('_')))
-                column_mapping[col] = camel_case
-            
-            df = df.rename(columns=column_mapping)
-            
-            # 特殊处理：alpha_id -> id
-            if 'alpha_id' in df.columns:
-                df = df.rename(columns={'alpha_id': 'id'})
-            
-            # 处理复杂字段：JSON字符串转回对象
-            complex_fields = ['tags', 'checks', 'os', 'train', 'test', 'prod', 
-                           'competitions', 'themes', 'team', 'pyramids', 'classifications']
-            
-            for field in complex_fields:
-                if field in df.columns:
-                    # 尝试解析JSON字符串
-                    def parse_json(value):
-                        if pd.isna(value) or value == '':
-                            return []
-                        try:
-                            return json.loads(value)
-                        except:
-                            return value
-                    
-                    df[field] = df[field].apply(parse_json)
-            
-            # 写入CSV文件
-            csv_path = os.path.join(self.records_path, 'submitable_alpha.csv')
-            df.to_csv(csv_path, index=False)
+            # alpha_id 转为 alphaId，与导入脚本的驼峰转下划线规则互逆
+            header = [
+                ''.join(word.capitalize() if i > 0 else word for i, word in enumerate(col.split('_')))
+                for col in columns
+            ]
+            
+            # 分块取行直接写入CSV，内存占用与表大小无关
+            count = 0
+            with open(csv_path, 'w', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE) as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                while rows:
+                    writer.writerows(rows)
+                    count += len(rows)
+                    rows = cursor.fetchmany(SUBMITABLE_EXPORT_CHUNK_SIZE)
             
-            count = len(df)
             print(f"✅ 可提交因子导出完成: {count} 条 -> submitable_alpha.csv")
             
         except Exception as e:
@@ -186,7 +234,7 @@ class FactorDataExporter:
         
         try:
             # 查询系统配置
-            cursor = self.conn.execute("""
+            cursor = self._get_conn().execute("""
                 SELECT config_key, config_value FROM system_config
             """)
             
@@ -194,7 +242,7 @@ class FactorDataExporter:
             
             # 导出开始日期
             if 'start_date' in configs:
-                start_date_path = os.path.join(self.records_path, 'start_date.txt')
+                start_date_path = self._records_dir / 'start_date.txt'
                 with open(start_date_path, 'w', encoding='utf-8') as f:
                     f.write(configs['start_date'])
                 print(f"✅ 开始日期配置导出完成: {configs['start_date']}")
@@ -202,7 +250,7 @@ class FactorDataExporter:
             # 导出其他配置（可选）
             for key, value in configs.items():
                 if key != 'start_date':
-                    config_file = os.path.join(self.records_path, f'{key}.txt')
+                    config_file = self._records_dir / f'{key}.txt'
                     with open(config_file, 'w', encoding='utf-8') as f:
                         f.write(str(value))
                     print(f"✅ 配置 {key} 导出完成")
@@ -215,19 +263,28 @@ class FactorDataExporter:
         print("\n📊 数据库统计信息:")
         
         try:
+            # 一次查询取得全部统计：system_overview 已包含三张数据表的记录数
+            # （迁移后由触发器维护的预聚合表提供，无需再逐表 COUNT(*) 全表扫描），
+            # 只有不在视图中的 system_config 单独计数
+            cursor = self._get_conn().execute("""
+                SELECT table_name, record_count, latest_update FROM system_overview
+                UNION ALL
+                SELECT 'system_config', COUNT(*), NULL FROM system_config
+            """)
+            rows = cursor.fetchall()
+            counts = {row[0]: row[1] for row in rows}
+            
             # 查询各表数据量
             tables = ['factor_expressions', 'checked_alphas', 'submitable_alphas', 'system_config']
             
             for table in tables:
-                cursor = self.conn.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
-                print(f"  {table}: {count} 条记录")
+                print(f"  {table}: {counts.get(table, 0)} 条记录")
             
             # 显示数据分布统计
             print("\n📈 数据分布统计:")
-            cursor = self.conn.execute("SELECT * FROM system_overview")
-            for row in cursor.fetchall():
-                print(f"  {row[0]}: {row[1]} 条记录，最新更新: {row[2]}")
+            for row in rows:
+                if row[0] != 'system_config':
+                    print(f"  {row[0]}: {row[1]} 条记录，最新更新: {row[2]}")
                 
         except Exception as e:
             print(f"❌ 获取数据库统计失败: {e}")
@@ -243,9 +300,9 @@ class FactorDataExporter:
                 "description": "从SQLite数据库导出到文本文件格式"
             }
             
-            backup_info_path = os.path.join(self.records_path, 'export_info.json')
-            with open(backup_info_path, 'w', encoding='utf-8') as f:
-                json.dump(backup_info, f, indent=2, ensure_ascii=False)
+            backup_info_path = self._records_dir / 'export_info.json'
+            with open(backup_info_path, 'wb') as f:
+                f.write(_dump_json_bytes(backup_info))
             
             print(f"✅ 导出信息已保存到: export_info.json")
             
@@ -260,11 +317,18 @@ class FactorDataExporter:
             return False
             
         try:
-            # 1. 导出各类数据
-            self.export_factor_expressions()
-            self.export_checked_alphas()
-            self.export_submitable_alphas()
-            self.export_config()
+            # 1. 导出各类数据：各方法扫描不同的表、写不同的文件，在线程池中并行执行，
+            #    每个线程使用独立连接（sqlite3在取数和写文件时释放GIL）
+            export_methods = [
+                self.export_factor_expressions,
+                self.export_checked_alphas,
+                self.export_submitable_alphas,
+                self.export_config,
+            ]
+            with ThreadPoolExecutor(max_workers=len(export_methods)) as executor:
+                futures = [executor.submit(self._run_with_own_connection, method) for method in export_methods]
+                for future in futures:
+                    future.result()
             
             # 2. 显示统计信息
             self.export_database_stats()
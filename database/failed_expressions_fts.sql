@@ -0,0 +1,35 @@
+-- ====================================================================
+-- failed_expressions.failure_reason 的trigram全文索引
+-- ====================================================================
+-- 外部内容表，不重复存储文本，由触发器与 failed_expressions 保持同步。
+-- 失败原因的子串过滤 LIKE '%x%' 无法使用B树索引，改为在此表上执行 LIKE 时按trigram查找匹配行。
+-- 依赖FTS5和trigram分词器（SQLite 3.34+），不放在 schema.sql 中：
+-- 新建数据库时由 FactorDatabaseManager 尝试创建，已有数据库由 upgrade_schema.py 创建，不支持时保留 LIKE 查询
+
+CREATE VIRTUAL TABLE IF NOT EXISTS failed_expressions_fts USING fts5(
+    failure_reason, content='failed_expressions', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_failed_expressions_fts_insert
+AFTER INSERT ON failed_expressions
+BEGIN
+    INSERT INTO failed_expressions_fts(rowid, failure_reason) VALUES (NEW.id, NEW.failure_reason);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_failed_expressions_fts_delete
+AFTER DELETE ON failed_expressions
+BEGIN
+    INSERT INTO failed_expressions_fts(failed_expressions_fts, rowid, failure_reason)
+    VALUES ('delete', OLD.id, OLD.failure_reason);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_failed_expressions_fts_update
+AFTER UPDATE OF failure_reason ON failed_expressions
+BEGIN
+    INSERT INTO failed_expressions_fts(failed_expressions_fts, rowid, failure_reason)
+    VALUES ('delete', OLD.id, OLD.failure_reason);
+    INSERT INTO failed_expressions_fts(rowid, failure_reason) VALUES (NEW.id, NEW.failure_reason);
+END;
+
+-- 从已有的失败记录填充（新建数据库时为空表，开销可忽略）
+INSERT INTO failed_expressions_fts(failed_expressions_fts) VALUES ('rebuild');
@@ -25,8 +25,13 @@ from database.partitioned_db_manager import PartitionedFactorManager
 from database.db_manager import FactorDatabaseManager
 
 
-def performance_test(db_manager, dataset_id: str, region: str, step: int, test_name: str):
-    """性能测试"""
+def performance_test(db_manager, dataset_id: str, region: str, step: int, test_name: str,
+                     sample_expression: str = None):
+    """性能测试
+    
+    sample_expression 为分析阶段预取的样本表达式，提供时直接用于存在性检查，
+    迁移前后检查同一条表达式
+    """
     print(f"🔬 {test_name} 性能测试...")
     
     # 测试查询性能
@@ -39,7 +44,7 @@ def performance_test(db_manager, dataset_id: str, region: str, step: int, test_n
     
     if len(expressions) > 0:
         # 测试存在性检查
-        test_expr = expressions[len(expressions)//2]
+        test_expr = sample_expression if sample_expression is not None else expressions[len(expressions)//2]
         start_time = time.time()
         exists = db_manager.is_expression_exists(test_expr, dataset_id, region, step)
         check_time = time.time() - start_time
@@ -82,18 +87,21 @@ def main():
         
         with main_db.get_connection() as conn:
             # 获取数据集统计
+            # 统计的同时为每个 (dataset_id, region, step) 取一条样本表达式，供性能测试使用
             cursor = conn.execute("""
-                SELECT dataset_id, region, step, COUNT(*) as count
+                SELECT dataset_id, region, step, COUNT(*) as count, MIN(expression) as sample_expression
                 FROM factor_expressions 
                 GROUP BY dataset_id, region, step
                 ORDER BY dataset_id, region, step
             """)
             
             dataset_stats = {}
+            sample_expressions = {}
             total_records = 0
             
             for row in cursor.fetchall():
-                dataset_id, region, step, count = row
+                dataset_id, region, step, count, sample_expression = row
+                sample_expressions[(dataset_id, region, step)] = sample_expression
                 if dataset_id not in dataset_stats:
                     dataset_stats[dataset_id] = {}
                 if region not in dataset_stats[dataset_id]:
@@ -138,7 +146,9 @@ def main():
             test_steps = list(dataset_stats[test_dataset][test_region].keys())
             test_step = test_steps[0] if test_steps else 1
             
-            old_time = performance_test(main_db, test_dataset, test_region, test_step, "主数据库")
+            test_sample = sample_expressions.get((test_dataset, test_region, test_step))
+            
+            old_time = performance_test(main_db, test_dataset, test_region, test_step, "主数据库", test_sample)
         
         # 3. 执行迁移
         print(f"\n🔄 开始迁移 {len(target_datasets)} 个数据集...")
@@ -168,7 +178,7 @@ def main():
         # 5. 性能测试（迁移后）
         if args.test_performance and target_datasets:
             print("\n🔬 迁移后性能测试...")
-            new_time = performance_test(partitioned_db, test_dataset, test_region, test_step, "分库数据库")
+            new_time = performance_test(partitioned_db, test_dataset, test_region, test_step, "分库数据库", test_sample)
             
             if old_time > 0:
                 improvement = ((old_time - new_time) / old_time) * 100
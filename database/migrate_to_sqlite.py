@@ -18,20 +18,85 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from config import RECORDS_PATH, ROOT_PATH
 
+# 读取记录文件时的缓冲区大小，减少大文件逐行读取时的read系统调用次数
+RECORD_READ_BUFFER_SIZE = 1 << 20
+
 class FactorDataMigrator:
-    def __init__(self, db_path='database/factors.db'):
-        """初始化迁移器"""
+    # 表达式文件与已检查文件共用一个预编译的文件名模式
+    _FILENAME_RE = re.compile(r'^(\w+)_(\w+)_(\d+)step_(?:simulated_alpha_expression|checked_alpha_id)\.txt$')
+    
+    def __init__(self, db_path='database/factors.db', bulk_mode=False):
+        """初始化迁移器
+        
+        Args:
+            db_path: 数据库路径（相对ROOT_PATH）
+            bulk_mode: 一次性初始迁移模式，迁移期间关闭日志落盘和fsync，结束后恢复WAL；
+                       仅在数据库文件尚不存在时生效，已有数据的数据库始终使用常规WAL设置。
+                       初始迁移中途中断时，删除新建的数据库文件后重新运行
+        """
         self.db_path = os.path.join(ROOT_PATH, db_path)
         self.records_path = RECORDS_PATH
+        self.bulk_mode = bulk_mode
+        self._bulk_active = False
         self.conn = None
         
         # 确保数据库目录存在
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
+    def _apply_pragmas(self, conn):
+        """设置迁移写入用的连接级PRAGMA（WAL须在任何写事务之前设置）"""
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+            PRAGMA busy_timeout = 5000;
+        """)
+        
+    def _apply_bulk_pragmas(self, conn):
+        """设置批量导入用的PRAGMA：回滚日志放在内存、不做fsync、独占数据库"""
+        try:
+            journal_mode = conn.execute("PRAGMA journal_mode = MEMORY").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            # 其他进程仍以WAL模式打开数据库时无法切换，退回常规设置
+            print(f"⚠️  无法切换到批量导入模式，使用常规设置: {e}")
+            self._apply_pragmas(conn)
+            return
+        if journal_mode.lower() != 'memory':
+            print(f"⚠️  无法切换到批量导入日志模式，当前日志模式: {journal_mode}")
+        conn.executescript("""
+            PRAGMA synchronous = OFF;
+            PRAGMA locking_mode = EXCLUSIVE;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+            PRAGMA busy_timeout = 5000;
+        """)
+        
+    def _restore_normal_pragmas(self, conn):
+        """批量导入结束后恢复WAL和常规同步级别，供日常运行使用"""
+        conn.executescript("""
+            PRAGMA locking_mode = NORMAL;
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+        """)
+        
     def connect_db(self):
         """连接数据库"""
         try:
+            # 批量导入模式下崩溃可能损坏数据库，只用于新建数据库的初始迁移；
+            # 容器每次启动都会对已有数据库运行本脚本，此时保持WAL和常规同步级别
+            db_exists = os.path.exists(self.db_path)
+            if self.bulk_mode and db_exists:
+                print("📝 数据库已存在，使用常规WAL设置进行增量迁移")
+            self._bulk_active = self.bulk_mode and not db_exists
+            
             self.conn = sqlite3.connect(self.db_path)
+            if self._bulk_active:
+                self._apply_bulk_pragmas(self.conn)
+            else:
+                self._apply_pragmas(self.conn)
             self.conn.execute("PRAGMA foreign_keys = ON")
             print(f"✅ 成功连接数据库: {self.db_path}")
             return True
@@ -57,23 +122,16 @@ class FactorDataMigrator:
                 self._add_recheck_flag_if_missing()
                 return True
             
-            # 读取并修改 schema.sql，添加 IF NOT EXISTS
+            # 读取 schema.sql（其中的建表/索引/视图均带 IF NOT EXISTS，可重复执行）
             schema_path = os.path.join(ROOT_PATH, 'database', 'schema.sql')
             with open(schema_path, 'r', encoding='utf-8') as f:
                 schema_sql = f.read()
             
-            # 替换 CREATE TABLE 为 CREATE TABLE IF NOT EXISTS
-            schema_sql = schema_sql.replace('CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS ')
-            # 替换 CREATE INDEX 为 CREATE INDEX IF NOT EXISTS  
-            schema_sql = schema_sql.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ')
-            # 替换 CREATE VIEW 为 CREATE VIEW IF NOT EXISTS
-            schema_sql = schema_sql.replace('CREATE VIEW ', 'CREATE VIEW IF NOT EXISTS ')
-            
-            # 处理 INSERT 语句，使用 INSERT OR IGNORE
-            schema_sql = schema_sql.replace('INSERT INTO system_config', 'INSERT OR IGNORE INTO system_config')
-            
-            # 执行SQL创建表
+            # 执行SQL创建表（每日提交统计表的定义在 daily_submit_stats.sql 中，紧随其后执行）
             self.conn.executescript(schema_sql)
+            daily_stats_path = os.path.join(ROOT_PATH, 'database', 'daily_submit_stats.sql')
+            with open(daily_stats_path, 'r', encoding='utf-8') as f:
+                self.conn.executescript(f.read())
             self.conn.commit()
             print("✅ 数据库表结构创建成功")
             
@@ -126,31 +184,35 @@ class FactorDataMigrator:
         """解析文件名获取数据集和地区信息"""
         # 示例: analyst4_usa_1step_simulated_alpha_expression.txt
         # 示例: fundamental2_usa_1step_simulated_alpha_expression.txt
-        patterns = [
-            r'(\w+)_(\w+)_(\d+)step_simulated_alpha_expression\.txt',
-            r'(\w+)_(\w+)_(\d+)step_checked_alpha_id\.txt'
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, filename)
-            if match:
-                dataset_id = match.group(1)
-                region = match.group(2).upper()
-                step = int(match.group(3))
-                return dataset_id, region, step
+        match = self._FILENAME_RE.match(filename)
+        if match:
+            dataset_id = match.group(1)
+            region = match.group(2).upper()
+            step = int(match.group(3))
+            return dataset_id, region, step
         
         return None, None, None
         
+    def _scan_record_files(self, suffix):
+        """列出记录目录中以指定后缀结尾的普通文件名（scandir 的目录项自带文件类型，无需额外stat）"""
+        with os.scandir(self.records_path) as entries:
+            return [entry.name for entry in entries if entry.name.endswith(suffix) and entry.is_file()]
+        
+    def _iter_record_rows(self, file_path, dataset_id, region, step):
+        """逐行读取记录文件，生成 (值, dataset_id, region, step) 插入参数，跳过空行"""
+        with open(file_path, 'r', encoding='utf-8', buffering=RECORD_READ_BUFFER_SIZE) as f:
+            for line in f:
+                value = line.strip()
+                if value:
+                    yield (value, dataset_id, region, step)
+        
     def migrate_factor_expressions(self):
         """迁移因子表达式数据"""
         print("\n🔄 开始迁移因子表达式数据...")
         total_migrated = 0
         
         # 查找所有表达式文件
-        expression_files = []
-        for file in os.listdir(self.records_path):
-            if file.endswith('_simulated_alpha_expression.txt'):
-                expression_files.append(file)
+        expression_files = self._scan_record_files('_simulated_alpha_expression.txt')
         
         for filename in expression_files:
             dataset_id, region, step = self.parse_filename_info(filename)
@@ -160,22 +222,21 @@ class FactorDataMigrator:
                 
             file_path = os.path.join(self.records_path, filename)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    expressions = [line.strip() for line in f if line.strip()]
-                
-                # 批量插入数据库
-                for expression in expressions:
-                    try:
-                        self.conn.execute("""
-                            INSERT OR IGNORE INTO factor_expressions 
-                            (expression, dataset_id, region, step) 
-                            VALUES (?, ?, ?, ?)
-                        """, (expression, dataset_id, region, step))
-                    except Exception as e:
-                        print(f"⚠️  插入表达式失败: {expression[:50]}... - {e}")
+                # 批量插入数据库：整个文件在一个显式事务中用 executemany 边读边写，
+                # 计数为实际新插入的条数
+                self.conn.execute("BEGIN")
+                try:
+                    cursor = self.conn.executemany("""
+                        INSERT OR IGNORE INTO factor_expressions 
+                        (expression, dataset_id, region, step) 
+                        VALUES (?, ?, ?, ?)
+                    """, self._iter_record_rows(file_path, dataset_id, region, step))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
                 
-                self.conn.commit()
-                count = len(expressions)
+                count = cursor.rowcount
                 total_migrated += count
                 print(f"✅ {filename}: 迁移 {count} 条表达式")
                 
@@ -190,10 +251,7 @@ class FactorDataMigrator:
         total_migrated = 0
         
         # 查找所有已检查文件
-        checked_files = []
-        for file in os.listdir(self.records_path):
-            if file.endswith('_checked_alpha_id.txt'):
-                checked_files.append(file)
+        checked_files = self._scan_record_files('_checked_alpha_id.txt')
         
         for filename in checked_files:
             dataset_id, region, step = self.parse_filename_info(filename)
@@ -203,22 +261,21 @@ class FactorDataMigrator:
                 
             file_path = os.path.join(self.records_path, filename)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    alpha_ids = [line.strip() for line in f if line.strip()]
-                
-                # 批量插入数据库
-                for alpha_id in alpha_ids:
-                    try:
-                        self.conn.execute("""
-                            INSERT OR IGNORE INTO checked_alphas 
-                            (alpha_id, dataset_id, region, step) 
-                            VALUES (?, ?, ?, ?)
-                        """, (alpha_id, dataset_id, region, step))
-                    except Exception as e:
-                        print(f"⚠️  插入Alpha ID失败: {alpha_id} - {e}")
+                # 批量插入数据库：整个文件在一个显式事务中用 executemany 边读边写，
+                # 计数为实际新插入的条数
+                self.conn.execute("BEGIN")
+                try:
+                    cursor = self.conn.executemany("""
+                        INSERT OR IGNORE INTO checked_alphas 
+                        (alpha_id, dataset_id, region, step) 
+                        VALUES (?, ?, ?, ?)
+                    """, self._iter_record_rows(file_path, dataset_id, region, step))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
                 
-                self.conn.commit()
-                count = len(alpha_ids)
+                count = cursor.rowcount
                 total_migrated += count
                 print(f"✅ {filename}: 迁移 {count} 个Alpha ID")
                 
@@ -253,18 +310,20 @@ class FactorDataMigrator:
             
             df = df.rename(columns=column_mapping)
             
-            # 逐行插入数据库，避免重复
-            for _, row in df.iterrows():
-                try:
-                    # 使用INSERT OR IGNORE避免重复插入
-                    columns = ', '.join(row.index)
-                    placeholders = ', '.join(['?' for _ in range(len(row))])
-                    query = f"INSERT OR IGNORE INTO submitable_alphas ({columns}) VALUES ({placeholders})"
-                    self.conn.execute(query, tuple(row.values))
-                except Exception as e:
-                    print(f"⚠️  插入可提交因子失败: {row.get('id', 'Unknown')} - {e}")
+            # SQL按列名只构建一次，空值转为None后整表用 executemany 在一个显式事务中插入，
+            # INSERT OR IGNORE 避免重复插入
+            columns = ', '.join(df.columns)
+            placeholders = ', '.join(['?'] * len(df.columns))
+            query = f"INSERT OR IGNORE INTO submitable_alphas ({columns}) VALUES ({placeholders})"
+            df = df.astype(object).where(df.notna(), None)
             
-            self.conn.commit()
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(query, df.itertuples(index=False, name=None))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
             
             count = len(df)
             print(f"✅ 可提交因子迁移完成: {count} 条")
@@ -354,6 +413,14 @@ class FactorDataMigrator:
             
         finally:
             if self.conn:
+                # 关闭前让SQLite按本次迁移的查询情况更新统计信息
+                try:
+                    self.conn.execute("PRAGMA optimize")
+                    if self._bulk_active:
+                        self._restore_normal_pragmas(self.conn)
+                except sqlite3.Error as e:
+                    if self._bulk_active:
+                        print(f"⚠️  恢复WAL日志模式失败: {e}")
                 self.conn.close()
 
 def main():
@@ -363,7 +430,8 @@ def main():
     print("  从文本文件迁移到SQLite数据库")
     print("=" * 60)
     
-    migrator = FactorDataMigrator()
+    # 数据库尚不存在时（一次性初始迁移）使用批量导入模式，已有数据库按常规设置增量迁移
+    migrator = FactorDataMigrator(bulk_mode=True)
     success = migrator.run_migration()
     
     if success:
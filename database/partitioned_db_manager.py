@@ -11,12 +11,38 @@
 """
 
 import os
+import queue
 import sqlite3
 import threading
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
 from database.db_manager import FactorDatabaseManager
 
+# 分库内的表达式表：expression 本身唯一，其唯一索引即按表达式去重所需的最短键；
+# 不再额外建 (expression, dataset_id, region, step) 复合唯一约束（分库内 dataset_id 恒定，且被 expression 唯一性蕴含）
+PARTITION_TABLE_SQL = """
+    CREATE TABLE {table_name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        expression TEXT NOT NULL UNIQUE,
+        dataset_id VARCHAR(50) NOT NULL,
+        region VARCHAR(10) NOT NULL,
+        step INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+PARTITION_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_expressions_region_step 
+    ON factor_expressions(region, step);
+    CREATE INDEX IF NOT EXISTS idx_expressions_created 
+    ON factor_expressions(created_at);
+    CREATE INDEX IF NOT EXISTS idx_expressions_covering 
+    ON factor_expressions(region, step, expression);
+"""
+
+# 每个分库最多保持的只读连接数（WAL模式下读连接之间、读与写之间互不阻塞）
+PARTITION_MAX_READERS = min(4, os.cpu_count() or 1)
+
 
 class PartitionedFactorManager:
     """数据集分库因子管理器"""
@@ -44,11 +70,21 @@ class PartitionedFactorManager:
         # 主数据库管理器（用于其他表）
         self.main_db = FactorDatabaseManager(main_db_path)
         
-        # 分库连接池
-        self._partition_connections = {}
-        self._connection_locks = {}
+        # 分库连接池：每个数据集一个写连接 + 若干只读连接
+        self._partition_pools = {}
         self._global_lock = threading.Lock()
         
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """设置分库连接级PRAGMA（WAL须在任何写事务之前设置）"""
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+            PRAGMA busy_timeout = 5000;
+        """)
+        
     def _get_partition_db_path(self, dataset_id: str) -> str:
         """获取数据集分库路径"""
         return os.path.join(self.partitions_dir, f'dataset_{dataset_id}.db')
@@ -60,32 +96,13 @@ class PartitionedFactorManager:
         if not os.path.exists(db_path):
             # 创建新的分库
             conn = sqlite3.connect(db_path)
-            conn.execute('''
-                CREATE TABLE factor_expressions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    expression TEXT NOT NULL UNIQUE,
-                    dataset_id VARCHAR(50) NOT NULL,
-                    region VARCHAR(10) NOT NULL,
-                    step INTEGER NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    
-                    UNIQUE(expression, dataset_id, region, step)
-                )
-            ''')
+            # 页大小只能在建表前、进入WAL模式前设置
+            conn.execute("PRAGMA page_size = 4096")
+            self._apply_pragmas(conn)
+            conn.execute(PARTITION_TABLE_SQL.format(table_name='factor_expressions'))
             
             # 创建优化索引
-            conn.execute('''
-                CREATE INDEX idx_expressions_region_step 
-                ON factor_expressions(region, step)
-            ''')
-            conn.execute('''
-                CREATE INDEX idx_expressions_created 
-                ON factor_expressions(created_at)
-            ''')
-            conn.execute('''
-                CREATE INDEX idx_expressions_covering 
-                ON factor_expressions(region, step, expression)
-            ''')
+            conn.executescript(PARTITION_INDEX_SQL)
             
             conn.commit()
             conn.close()
@@ -93,23 +110,97 @@ class PartitionedFactorManager:
         
         return db_path
     
+    def _upgrade_partition_schema(self, conn: sqlite3.Connection):
+        """将旧版分库表（含冗余的复合唯一约束）重建为当前结构
+        
+        约束无法单独删除，只能在一个事务内建新表、复制数据、替换旧表
+        """
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'factor_expressions'"
+        ).fetchone()
+        if row is None or 'UNIQUE(expression, dataset_id, region, step)' not in row[0]:
+            return
+        
+        try:
+            conn.executescript(f"""
+                BEGIN IMMEDIATE;
+                {PARTITION_TABLE_SQL.format(table_name='factor_expressions_new')};
+                INSERT INTO factor_expressions_new (id, expression, dataset_id, region, step, created_at)
+                SELECT id, expression, dataset_id, region, step, created_at FROM factor_expressions;
+                DROP TABLE factor_expressions;
+                ALTER TABLE factor_expressions_new RENAME TO factor_expressions;
+                {PARTITION_INDEX_SQL}
+                COMMIT;
+            """)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        print("✅ 分库表结构已升级：移除冗余的复合唯一约束")
+    
+    def _open_partition_connection(self, db_path: str, read_only: bool = False) -> sqlite3.Connection:
+        """打开分库连接，只读连接额外设置 query_only"""
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._apply_pragmas(conn)
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            self._upgrade_partition_schema(conn)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _get_partition_pool(self, dataset_id: str) -> Dict[str, Any]:
+        """获取数据集分库的连接池，首次访问时创建分库和写连接"""
+        with self._global_lock:
+            pool = self._partition_pools.get(dataset_id)
+            if pool is None:
+                db_path = self._ensure_partition_db(dataset_id)
+                pool = {
+                    'db_path': db_path,
+                    # 写连接先于读连接创建，旧版表结构的升级在此完成
+                    'writer': self._open_partition_connection(db_path),
+                    'writer_lock': threading.Lock(),
+                    'readers': queue.Queue(),
+                    'reader_count': 0,
+                }
+                self._partition_pools[dataset_id] = pool
+            return pool
+    
     @contextmanager
     def _get_partition_connection(self, dataset_id: str):
-        """获取数据集分库连接（线程安全）"""
-        with self._global_lock:
-            if dataset_id not in self._connection_locks:
-                self._connection_locks[dataset_id] = threading.Lock()
+        """获取数据集分库的写连接（同一分库的写操作串行执行）"""
+        pool = self._get_partition_pool(dataset_id)
+        with pool['writer_lock']:
+            yield pool['writer']
+    
+    @contextmanager
+    def _get_partition_reader(self, dataset_id: str):
+        """从连接池借出数据集分库的只读连接（不受写锁影响）"""
+        pool = self._get_partition_pool(dataset_id)
+        try:
+            conn = pool['readers'].get_nowait()
+        except queue.Empty:
+            with self._global_lock:
+                if pool['reader_count'] < PARTITION_MAX_READERS:
+                    pool['reader_count'] += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._open_partition_connection(pool['db_path'], read_only=True)
+                except Exception:
+                    with self._global_lock:
+                        pool['reader_count'] -= 1
+                    raise
+            else:
+                # 只读连接已达上限，等待其他线程归还
+                conn = pool['readers'].get()
         
-        with self._connection_locks[dataset_id]:
-            db_path = self._ensure_partition_db(dataset_id)
-            
-            if dataset_id not in self._partition_connections:
-                self._partition_connections[dataset_id] = sqlite3.connect(
-                    db_path, check_same_thread=False
-                )
-                self._partition_connections[dataset_id].row_factory = sqlite3.Row
-            
-            yield self._partition_connections[dataset_id]
+        try:
+            yield conn
+        finally:
+            pool['readers'].put(conn)
     
     def add_factor_expression(self, expression: str, dataset_id: str, 
                             region: str, step: int) -> bool:
@@ -147,7 +238,7 @@ class PartitionedFactorManager:
     def get_factor_expressions(self, dataset_id: str, region: str, step: int) -> List[str]:
         """从对应的数据集分库获取因子表达式列表"""
         try:
-            with self._get_partition_connection(dataset_id) as conn:
+            with self._get_partition_reader(dataset_id) as conn:
                 cursor = conn.execute("""
                     SELECT expression FROM factor_expressions 
                     WHERE dataset_id = ? AND region = ? AND step = ?
@@ -162,7 +253,7 @@ class PartitionedFactorManager:
                            region: str, step: int) -> bool:
         """检查表达式是否已存在于对应的数据集分库"""
         try:
-            with self._get_partition_connection(dataset_id) as conn:
+            with self._get_partition_reader(dataset_id) as conn:
                 cursor = conn.execute("""
                     SELECT 1 FROM factor_expressions 
                     WHERE expression = ? AND dataset_id = ? AND region = ? AND step = ?
@@ -176,7 +267,7 @@ class PartitionedFactorManager:
     def get_expression_count(self, dataset_id: str, region: str = None, step: int = None) -> int:
         """获取指定数据集的表达式数量"""
         try:
-            with self._get_partition_connection(dataset_id) as conn:
+            with self._get_partition_reader(dataset_id) as conn:
                 if region and step:
                     cursor = conn.execute("""
                         SELECT COUNT(*) FROM factor_expressions 
@@ -207,7 +298,7 @@ class PartitionedFactorManager:
         stats = {}
         for dataset_id in self.get_all_datasets():
             try:
-                with self._get_partition_connection(dataset_id) as conn:
+                with self._get_partition_reader(dataset_id) as conn:
                     # 总记录数
                     cursor = conn.execute("SELECT COUNT(*) FROM factor_expressions")
                     total_count = cursor.fetchone()[0]
@@ -245,50 +336,64 @@ class PartitionedFactorManager:
         
         return stats
     
+    def _copy_dataset_from_main_db(self, dataset_id: str) -> int:
+        """ATTACH 主数据库，在分库连接上用一条 INSERT ... SELECT 复制单个数据集
+        
+        数据在SQLite内部完成复制，不经过Python逐行处理；每个数据集一个事务
+        """
+        with self._get_partition_connection(dataset_id) as partition_conn:
+            partition_conn.execute("ATTACH DATABASE ? AS main_src", (self.main_db.db_path,))
+            try:
+                cursor = partition_conn.execute("""
+                    INSERT OR IGNORE INTO factor_expressions 
+                    (expression, dataset_id, region, step) 
+                    SELECT expression, dataset_id, region, step 
+                    FROM main_src.factor_expressions 
+                    WHERE dataset_id = ? 
+                    ORDER BY created_at
+                """, (dataset_id,))
+                partition_conn.commit()
+                return cursor.rowcount
+            except Exception:
+                partition_conn.rollback()
+                raise
+            finally:
+                partition_conn.execute("DETACH DATABASE main_src")
+    
     def migrate_from_main_db(self, dataset_ids: List[str] = None) -> Dict[str, int]:
         """从主数据库迁移数据到分库"""
         migration_stats = {}
         
         try:
-            # 从主数据库获取所有factor_expressions数据
-            with self.main_db.get_connection() as conn:
+            # 只取各数据集的记录数，表达式本身由分库连接直接从主库读取
+            with self.main_db._read_connection() as conn:
                 if dataset_ids:
                     placeholders = ','.join(['?' for _ in dataset_ids])
                     cursor = conn.execute(f"""
-                        SELECT dataset_id, region, step, expression 
+                        SELECT dataset_id, COUNT(*) 
                         FROM factor_expressions 
                         WHERE dataset_id IN ({placeholders})
-                        ORDER BY dataset_id, created_at
+                        GROUP BY dataset_id
                     """, dataset_ids)
                 else:
                     cursor = conn.execute("""
-                        SELECT dataset_id, region, step, expression 
+                        SELECT dataset_id, COUNT(*) 
                         FROM factor_expressions 
-                        ORDER BY dataset_id, created_at
+                        GROUP BY dataset_id
                     """)
-                
-                # 按数据集分组
-                dataset_expressions = {}
-                for row in cursor.fetchall():
-                    dataset_id, region, step, expression = row
-                    if dataset_id not in dataset_expressions:
-                        dataset_expressions[dataset_id] = []
-                    dataset_expressions[dataset_id].append((expression, region, step))
-                
-                # 迁移到对应分库
-                for dataset_id, expressions in dataset_expressions.items():
-                    print(f"🔄 迁移数据集 {dataset_id}: {len(expressions)} 条记录")
-                    
-                    with self._get_partition_connection(dataset_id) as partition_conn:
-                        data = [(expr, dataset_id, region, step) for expr, region, step in expressions]
-                        cursor = partition_conn.executemany("""
-                            INSERT OR IGNORE INTO factor_expressions 
-                            (expression, dataset_id, region, step) 
-                            VALUES (?, ?, ?, ?)
-                        """, data)
-                        partition_conn.commit()
-                        migration_stats[dataset_id] = cursor.rowcount
-                        print(f"✅ 数据集 {dataset_id} 迁移完成: {cursor.rowcount} 条记录")
+                dataset_counts = cursor.fetchall()
+            
+            # 迁移到对应分库
+            for dataset_id, count in dataset_counts:
+                print(f"🔄 迁移数据集 {dataset_id}: {count} 条记录")
+                try:
+                    migrated = self._copy_dataset_from_main_db(dataset_id)
+                except Exception as e:
+                    # 单个数据集失败（已回滚）不影响其余数据集
+                    print(f"❌ 数据集 {dataset_id} 迁移失败: {e}")
+                    continue
+                migration_stats[dataset_id] = migrated
+                print(f"✅ 数据集 {dataset_id} 迁移完成: {migrated} 条记录")
         
         except Exception as e:
             print(f"❌ 数据迁移失败: {e}")
@@ -319,13 +424,22 @@ class PartitionedFactorManager:
     def close_all_connections(self):
         """关闭所有分库连接"""
         with self._global_lock:
-            for conn in self._partition_connections.values():
+            for pool in self._partition_pools.values():
+                connections = [pool['writer']]
+                while not pool['readers'].empty():
+                    connections.append(pool['readers'].get_nowait())
+                
                 try:
-                    conn.close()
+                    # 关闭前让SQLite按查询情况更新统计信息（只读连接无法写入统计表，由写连接执行）
+                    pool['writer'].execute("PRAGMA optimize")
                 except:
                     pass
-            self._partition_connections.clear()
-            self._connection_locks.clear()
+                for conn in connections:
+                    try:
+                        conn.close()
+                    except:
+                        pass
+            self._partition_pools.clear()
     
     # 代理主数据库的其他方法
     def __getattr__(self, name):
@@ -3,11 +3,13 @@
 -- ====================================================================
 -- 创建日期: 2025-01-15
 -- 目标: 替换文本文件存储，提升查询性能和并发安全性
+-- 说明: 仅在新建数据库时执行，直接得到最新结构（末尾写入 PRAGMA user_version）；
+--       已有数据库的结构变更由 upgrade_schema.py 按版本号依次执行
 
 -- ====================================================================
 -- 1. 因子表达式表 - 替换 *_simulated_alpha_expression.txt 文件
 -- ====================================================================
-CREATE TABLE factor_expressions (
+CREATE TABLE IF NOT EXISTS factor_expressions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     expression TEXT NOT NULL UNIQUE,           -- 因子表达式内容
     dataset_id VARCHAR(50) NOT NULL,           -- 数据集ID (analyst4, fundamental2等)
@@ -22,7 +24,7 @@ CREATE TABLE factor_expressions (
 -- ====================================================================
 -- 2. 已检查因子表 - 替换 *_checked_alpha_id.txt 文件
 -- ====================================================================
-CREATE TABLE checked_alphas (
+CREATE TABLE IF NOT EXISTS checked_alphas (
     alpha_id VARCHAR(100) PRIMARY KEY,         -- Alpha ID
     dataset_id VARCHAR(50) NOT NULL,           -- 数据集ID
     region VARCHAR(10) NOT NULL,               -- 地区
@@ -33,7 +35,7 @@ CREATE TABLE checked_alphas (
 -- ====================================================================
 -- 3. 可提交因子表 - 替换 submitable_alpha.csv 文件
 -- ====================================================================
-CREATE TABLE submitable_alphas (
+CREATE TABLE IF NOT EXISTS submitable_alphas (
     alpha_id VARCHAR(100) PRIMARY KEY,         -- Alpha ID
     type VARCHAR(50),                          -- 类型
     author VARCHAR(100),                       -- 作者
@@ -100,7 +102,7 @@ CREATE TABLE submitable_alphas (
 -- ====================================================================
 -- 4. 失败表达式表 - 存储模拟失败的因子表达式（仅记录真正无法模拟的表达式）
 -- ====================================================================
-CREATE TABLE failed_expressions (
+CREATE TABLE IF NOT EXISTS failed_expressions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     expression TEXT NOT NULL,                  -- 失败的因子表达式
     dataset_id VARCHAR(50) NOT NULL,           -- 数据集ID (analyst4, fundamental2等)
@@ -117,7 +119,7 @@ CREATE TABLE failed_expressions (
 -- ====================================================================
 -- 5. 系统配置表 - 替换 start_date.txt 等配置文件
 -- ====================================================================
-CREATE TABLE system_config (
+CREATE TABLE IF NOT EXISTS system_config (
     config_key VARCHAR(100) PRIMARY KEY,       -- 配置键
     config_value TEXT NOT NULL,                -- 配置值
     description TEXT,                          -- 描述
@@ -125,7 +127,7 @@ CREATE TABLE system_config (
 );
 
 -- 插入默认配置
-INSERT INTO system_config (config_key, config_value, description) VALUES 
+INSERT OR IGNORE INTO system_config (config_key, config_value, description) VALUES 
 ('start_date', '2025-07-27', '因子挖掘开始日期'),
 ('db_version', '1.1', '数据库版本'),
 ('migration_date', datetime('now'), '数据迁移日期');
@@ -135,34 +137,89 @@ INSERT INTO system_config (config_key, config_value, description) VALUES
 -- ====================================================================
 
 -- 因子表达式索引
-CREATE INDEX idx_expressions_dataset_region_step ON factor_expressions(dataset_id, region, step);
-CREATE INDEX idx_expressions_created ON factor_expressions(created_at);
+-- (dataset_id, region, step, created_at) 索引：按分区 ORDER BY created_at 读取时直接按索引顺序扫描，无需临时排序；
+-- 其前缀已覆盖原 (dataset_id, region, step) 索引。不把 expression 放进索引，避免索引体积翻倍、拖慢每次写入
+CREATE INDEX IF NOT EXISTS idx_expressions_partition_time ON factor_expressions(dataset_id, region, step, created_at);
+CREATE INDEX IF NOT EXISTS idx_expressions_created ON factor_expressions(created_at);
+-- 表达式长度的表达式索引：分析报告按 LENGTH(expression) 分组时按索引顺序流式聚合，无需排序，取前10组即可结束
+CREATE INDEX IF NOT EXISTS idx_expressions_length ON factor_expressions(LENGTH(expression));
 
 -- 已检查因子索引  
-CREATE INDEX idx_checked_dataset_region_step ON checked_alphas(dataset_id, region, step);
-CREATE INDEX idx_checked_date ON checked_alphas(checked_at);
+CREATE INDEX IF NOT EXISTS idx_checked_partition_checked ON checked_alphas(dataset_id, region, step, checked_at, alpha_id);
+CREATE INDEX IF NOT EXISTS idx_checked_date ON checked_alphas(checked_at);
 
 -- 可提交因子索引
-CREATE INDEX idx_submitable_region_universe ON submitable_alphas(region, universe);
-CREATE INDEX idx_submitable_sharpe ON submitable_alphas(sharpe);
-CREATE INDEX idx_submitable_created ON submitable_alphas(created_at);
-CREATE INDEX idx_submitable_recheck_flag ON submitable_alphas(recheck_flag);
-CREATE INDEX idx_submitable_region_recheck ON submitable_alphas(region, recheck_flag);
+CREATE INDEX IF NOT EXISTS idx_submitable_region_universe ON submitable_alphas(region, universe);
+CREATE INDEX IF NOT EXISTS idx_submitable_sharpe ON submitable_alphas(sharpe);
+CREATE INDEX IF NOT EXISTS idx_submitable_created ON submitable_alphas(created_at);
+CREATE INDEX IF NOT EXISTS idx_submitable_recheck_flag ON submitable_alphas(recheck_flag);
+CREATE INDEX IF NOT EXISTS idx_submitable_region_recheck ON submitable_alphas(region, recheck_flag);
 
 -- 失败表达式索引
-CREATE INDEX idx_failed_expressions_dataset_region_step ON failed_expressions(dataset_id, region, step);
-CREATE INDEX idx_failed_expressions_reason ON failed_expressions(failure_reason);
-CREATE INDEX idx_failed_expressions_created ON failed_expressions(created_at);
+-- (dataset_id, region, step, created_at) 复合索引：按分区过滤并 ORDER BY created_at DESC LIMIT 读取时
+-- 沿索引反向扫描取前N条，无需临时B树排序；其前缀已覆盖原 (dataset_id, region, step) 索引
+CREATE INDEX IF NOT EXISTS idx_failed_partition_created ON failed_expressions(dataset_id, region, step, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_failed_expressions_reason ON failed_expressions(failure_reason);
+CREATE INDEX IF NOT EXISTS idx_failed_expressions_created ON failed_expressions(created_at);
 
 -- 系统配置索引
-CREATE INDEX idx_config_key ON system_config(config_key);
+CREATE INDEX IF NOT EXISTS idx_config_key ON system_config(config_key);
+
+-- ====================================================================
+-- 表变更计数 - FactorDatabaseManager 的查询结果缓存据此判断表是否变化
+-- ====================================================================
+-- 任何增、删、改（包括其他进程的写入和原地UPDATE）都会使计数加1，计数不变即表内容未变
+CREATE TABLE IF NOT EXISTS table_change_counter (
+    table_name TEXT PRIMARY KEY,
+    change_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO table_change_counter (table_name) VALUES
+('factor_expressions'),
+('checked_alphas');
+
+CREATE TRIGGER IF NOT EXISTS trg_factor_expressions_change_insert
+AFTER INSERT ON factor_expressions
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'factor_expressions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_factor_expressions_change_update
+AFTER UPDATE ON factor_expressions
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'factor_expressions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_factor_expressions_change_delete
+AFTER DELETE ON factor_expressions
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'factor_expressions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checked_alphas_change_insert
+AFTER INSERT ON checked_alphas
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'checked_alphas';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checked_alphas_change_update
+AFTER UPDATE ON checked_alphas
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'checked_alphas';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checked_alphas_change_delete
+AFTER DELETE ON checked_alphas
+BEGIN
+    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = 'checked_alphas';
+END;
 
 -- ====================================================================
 -- 性能优化视图
 -- ====================================================================
 
 -- 因子表达式统计视图
-CREATE VIEW factor_expression_stats AS
+CREATE VIEW IF NOT EXISTS factor_expression_stats AS
 SELECT 
     dataset_id,
     region,
@@ -173,7 +230,7 @@ FROM factor_expressions
 GROUP BY dataset_id, region, step;
 
 -- 已检查因子统计视图
-CREATE VIEW checked_alpha_stats AS
+CREATE VIEW IF NOT EXISTS checked_alpha_stats AS
 SELECT 
     dataset_id,
     region,
@@ -184,35 +241,33 @@ FROM checked_alphas
 GROUP BY dataset_id, region, step;
 
 -- 失败表达式统计视图
-CREATE VIEW failed_expression_stats AS
+CREATE VIEW IF NOT EXISTS failed_expression_stats AS
 SELECT 
     dataset_id,
     region,
     step,
     failure_reason,
-    failure_stage,
     COUNT(*) as failure_count,
     COUNT(DISTINCT expression) as unique_expressions,
     MAX(created_at) as latest_failure
 FROM failed_expressions 
-GROUP BY dataset_id, region, step, failure_reason, failure_stage;
+GROUP BY dataset_id, region, step, failure_reason;
 
 -- 失败表达式按原因统计视图
-CREATE VIEW failure_reason_stats AS
+CREATE VIEW IF NOT EXISTS failure_reason_stats AS
 SELECT 
     failure_reason,
-    failure_stage,
     COUNT(*) as total_failures,
     COUNT(DISTINCT expression) as unique_failed_expressions,
     COUNT(DISTINCT dataset_id) as affected_datasets,
     AVG(LENGTH(expression)) as avg_expression_length,
     MAX(created_at) as latest_occurrence
 FROM failed_expressions 
-GROUP BY failure_reason, failure_stage
+GROUP BY failure_reason
 ORDER BY total_failures DESC;
 
 -- 失败表达式按数据集统计视图
-CREATE VIEW failure_dataset_stats AS
+CREATE VIEW IF NOT EXISTS failure_dataset_stats AS
 SELECT 
     dataset_id,
     region,
@@ -228,62 +283,11 @@ ORDER BY total_failures DESC;
 -- ====================================================================
 -- 4. 每日提交统计表 - 记录每天成功提交的因子数量
 -- ====================================================================
-CREATE TABLE daily_submit_stats (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    date DATE NOT NULL,                           -- 日期 YYYY-MM-DD
-    successful_submits INTEGER DEFAULT 0,         -- 当日成功提交数量
-    total_attempts INTEGER DEFAULT 0,             -- 当日总尝试数量
-    timezone VARCHAR(20) DEFAULT 'UTC',           -- 使用的时区
-    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
-    
-    -- 约束检查
-    CHECK (successful_submits >= 0),
-    CHECK (total_attempts >= successful_submits),
-    
-    -- 复合唯一约束：日期+时区组合唯一
-    UNIQUE(date, timezone)
-);
-
--- 创建日期索引
-CREATE INDEX idx_daily_submit_stats_date ON daily_submit_stats(date);
+-- daily_submit_stats 表及 daily_submit_overview / system_overview 视图定义在 daily_submit_stats.sql 中，
+-- 新建数据库时紧随本文件执行
 
--- 每日提交统计视图
-CREATE VIEW daily_submit_overview AS
-SELECT 
-    date,
-    successful_submits,
-    total_attempts,
-    timezone,
-    CASE 
-        WHEN total_attempts > 0 THEN ROUND(successful_submits * 100.0 / total_attempts, 1)
-        ELSE 0
-    END as success_rate,
-    last_updated
-FROM daily_submit_stats
-ORDER BY date DESC;
-
--- 系统状态总览视图
-CREATE VIEW system_overview AS
-SELECT 
-    'factor_expressions' as table_name,
-    COUNT(*) as record_count,
-    MAX(created_at) as latest_update
-FROM factor_expressions
-UNION ALL
-SELECT 
-    'checked_alphas' as table_name,
-    COUNT(*) as record_count,
-    MAX(checked_at) as latest_update
-FROM checked_alphas
-UNION ALL
-SELECT 
-    'submitable_alphas' as table_name,
-    COUNT(*) as record_count,
-    MAX(created_at) as latest_update
-FROM submitable_alphas
-UNION ALL
-SELECT 
-    'daily_submit_stats' as table_name,
-    COUNT(*) as record_count,
-    MAX(last_updated) as latest_update
-FROM daily_submit_stats;
\ No newline at end of file
+-- ====================================================================
+-- 结构版本号：必须等于 upgrade_schema.py 中最后一个迁移的版本号，
+-- 新建的数据库由此跳过全部升级步骤
+-- ====================================================================
+PRAGMA user_version = 5;
@@ -42,6 +42,9 @@ def test_database_creation():
             schema_sql = f.read()
         
         conn.executescript(schema_sql)
+        # 每日提交统计表及 system_overview 视图的定义在 daily_submit_stats.sql 中，与新建数据库时一致紧随其后执行
+        with open(os.path.join(ROOT_PATH, 'database', 'daily_submit_stats.sql'), 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
         print("✅ 数据库表结构创建成功")
         
         # 验证表是否创建成功
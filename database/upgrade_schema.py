@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+数据库结构升级脚本
+按版本号依次执行已有数据库缺少的结构变更，已完成的版本记录在 PRAGMA user_version 中，
+重复运行时只执行尚未完成的版本。新建的数据库由 schema.sql 和 daily_submit_stats.sql 直接创建为最新结构，无需执行本脚本。
+
+新增结构变更时：在 MIGRATIONS 末尾追加一个版本，并同步修改 schema.sql 及其末尾的 user_version。
+"""
+
+import os
+import sys
+import sqlite3
+import contextlib
+
+from add_daily_submit_stats import table_exists, is_current_layout, install_daily_submit_stats, rebuild_daily_submit_stats
+
+# 项目根目录（与 src/config.py 的 ROOT_PATH 一致），直接计算以免为一个常量导入整个config模块
+ROOT_PATH = os.environ.get('PROJECT_ROOT') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def upgrade_query_indexes(cursor):
+    """版本1：按分区读取的复合索引及表达式长度索引，替换原 (dataset_id, region, step) 索引"""
+    cursor.executescript("""
+        BEGIN IMMEDIATE;
+
+        CREATE INDEX IF NOT EXISTS idx_expressions_partition_time ON factor_expressions(dataset_id, region, step, created_at);
+        DROP INDEX IF EXISTS idx_expressions_partition_created;
+        DROP INDEX IF EXISTS idx_expressions_dataset_region_step;
+        CREATE INDEX IF NOT EXISTS idx_expressions_length ON factor_expressions(LENGTH(expression));
+
+        CREATE INDEX IF NOT EXISTS idx_checked_partition_checked ON checked_alphas(dataset_id, region, step, checked_at, alpha_id);
+        DROP INDEX IF EXISTS idx_checked_dataset_region_step;
+
+        CREATE INDEX IF NOT EXISTS idx_failed_partition_created ON failed_expressions(dataset_id, region, step, created_at DESC);
+        DROP INDEX IF EXISTS idx_failed_expressions_dataset_region_step;
+
+        -- 只更新索引有变化的表的统计信息
+        ANALYZE factor_expressions;
+        ANALYZE checked_alphas;
+        ANALYZE failed_expressions;
+    """)
+
+def upgrade_table_change_counter(cursor):
+    """版本2：表变更计数及其触发器（FactorDatabaseManager 的查询结果缓存据此判断表是否变化）"""
+    statements = ["""
+        BEGIN IMMEDIATE;
+
+        CREATE TABLE IF NOT EXISTS table_change_counter (
+            table_name TEXT PRIMARY KEY,
+            change_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        INSERT OR IGNORE INTO table_change_counter (table_name) VALUES
+        ('factor_expressions'),
+        ('checked_alphas');
+    """]
+    for table_name in ('factor_expressions', 'checked_alphas'):
+        for event in ('insert', 'update', 'delete'):
+            statements.append(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table_name}_change_{event}
+                AFTER {event.upper()} ON {table_name}
+                BEGIN
+                    UPDATE table_change_counter SET change_count = change_count + 1 WHERE table_name = '{table_name}';
+                END;
+            """)
+    cursor.executescript("".join(statements))
+
+def upgrade_failed_expression_views(cursor):
+    """版本3：重建引用了不存在的 failure_stage 列的统计视图
+
+    这两个视图无法查询，且会使后续任何 ALTER TABLE ... RENAME 在校验视图时报错
+    """
+    cursor.executescript("""
+        BEGIN IMMEDIATE;
+
+        DROP VIEW IF EXISTS failed_expression_stats;
+        CREATE VIEW failed_expression_stats AS
+        SELECT
+            dataset_id,
+            region,
+            step,
+            failure_reason,
+            COUNT(*) as failure_count,
+            COUNT(DISTINCT expression) as unique_expressions,
+            MAX(created_at) as latest_failure
+        FROM failed_expressions
+        GROUP BY dataset_id, region, step, failure_reason;
+
+        DROP VIEW IF EXISTS failure_reason_stats;
+        CREATE VIEW failure_reason_stats AS
+        SELECT
+            failure_reason,
+            COUNT(*) as total_failures,
+            COUNT(DISTINCT expression) as unique_failed_expressions,
+            COUNT(DISTINCT dataset_id) as affected_datasets,
+            AVG(LENGTH(expression)) as avg_expression_length,
+            MAX(created_at) as latest_occurrence
+        FROM failed_expressions
+        GROUP BY failure_reason
+        ORDER BY total_failures DESC;
+    """)
+
+def upgrade_failure_reason_fts(cursor):
+    """版本4：失败原因的trigram全文索引，SQLite不支持时跳过（继续使用 LIKE 查询）"""
+    fts_path = os.path.join(ROOT_PATH, 'database', 'failed_expressions_fts.sql')
+    with open(fts_path, 'r', encoding='utf-8') as f:
+        fts_sql = f.read()
+    try:
+        cursor.executescript("BEGIN IMMEDIATE;\n" + fts_sql)
+    except sqlite3.OperationalError as e:
+        # 缺少FTS5模块或trigram分词器（SQLite 3.34以下）
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
+        print(f"⚠️  失败原因全文索引不可用，继续使用 LIKE 查询: {e}")
+        cursor.execute("BEGIN IMMEDIATE")
+
+def upgrade_daily_submit_stats(cursor):
+    """版本5：daily_submit_stats 统一为 daily_submit_stats.sql 中的结构，旧结构的表重建后恢复数据"""
+    if table_exists(cursor, 'daily_submit_stats') and not is_current_layout(cursor):
+        restored_count, duplicates_found = rebuild_daily_submit_stats(cursor)
+        print(f"   重建了 daily_submit_stats，恢复 {restored_count} 条记录，合并 {duplicates_found} 条重复记录")
+    else:
+        install_daily_submit_stats(cursor)
+    cursor.execute("ANALYZE daily_submit_stats")
+
+# (版本号, 说明, 升级函数)。升级函数以 BEGIN IMMEDIATE 开启事务且不提交，
+# 由 upgrade() 在同一事务中写入版本号后提交，失败时整体回滚
+MIGRATIONS = [
+    (1, '查询索引', upgrade_query_indexes),
+    (2, '表变更计数', upgrade_table_change_counter),
+    (3, '修复失败表达式统计视图', upgrade_failed_expression_views),
+    (4, '失败原因全文索引', upgrade_failure_reason_fts),
+    (5, '每日提交统计表', upgrade_daily_submit_stats),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def upgrade(conn):
+    """执行尚未完成的全部版本，返回执行的版本数"""
+    cursor = conn.cursor()
+    current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    applied = 0
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        print(f"📝 版本 {version}: {description}...")
+        try:
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            cursor.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        print(f"✅ 版本 {version} 完成")
+        applied += 1
+    return applied
+
+def main():
+    """主函数"""
+    print("🚀 数据库结构升级")
+    print("="*50)
+
+    db_path = os.path.join(ROOT_PATH, 'database', 'factors.db')
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        print("   新建的数据库直接创建为最新结构，无需升级")
+        return False
+
+    print(f"📂 数据库路径: {db_path}")
+
+    try:
+        # 自动提交模式，每个版本由显式事务管理；closing 保证连接最终关闭
+        with contextlib.closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
+            conn.execute("PRAGMA busy_timeout = 30000")
+            current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            print(f"📋 当前结构版本: {current_version}，最新版本: {LATEST_VERSION}")
+
+            applied = upgrade(conn)
+            if applied:
+                print(f"\n🎉 升级完成，共执行 {applied} 个版本")
+            else:
+                print("\n✅ 数据库结构已是最新，无需升级")
+        return True
+
+    except Exception as e:
+        print(f"❌ 升级失败: {e}")
+        import traceback
+        traceback.print_exc(file=sys.stdout)
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -13,7 +13,7 @@ from typing import Optional
 # 添加src目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from db_manager import FactorDatabaseManager
+from db_manager import FactorDatabaseManager, FAILED_EXPRESSION_COLUMNS
 
 def view_failed_expressions(dataset_id: Optional[str] = None, 
                           region: Optional[str] = None,
@@ -33,7 +33,7 @@ def view_failed_expressions(dataset_id: Optional[str] = None,
     print("=" * 80)
     
     # 获取失败表达式列表
-    failed_expressions = db.get_failed_expressions(
+    failed_expressions = db.get_failed_expressions_raw(
         dataset_id=dataset_id,
         region=region,
         step=step,
@@ -46,7 +46,7 @@ def view_failed_expressions(dataset_id: Optional[str] = None,
         return
     
     # 转换为DataFrame以便更好地显示
-    df = pd.DataFrame(failed_expressions)
+    df = pd.DataFrame(failed_expressions, columns=FAILED_EXPRESSION_COLUMNS)
     
     print(f"📋 找到 {len(failed_expressions)} 条失败记录:\n")
     
@@ -117,13 +117,13 @@ def show_failure_stats():
     print("=" * 60)
     
     # 获取所有失败表达式进行自定义统计
-    failed_expressions = db.get_failed_expressions(limit=10000)
+    failed_expressions = db.get_failed_expressions_raw(limit=10000)
     
     if not failed_expressions:
         print("✅ 没有找到失败表达式记录")
         return
     
-    df = pd.DataFrame(failed_expressions)
+    df = pd.DataFrame(failed_expressions, columns=FAILED_EXPRESSION_COLUMNS)
     
     # 解析error_details中的message
     def extract_error_message(error_details):
@@ -216,14 +216,14 @@ def export_failed_expressions(output_file: str, **filters):
     print(f"📤 导出失败表达式到 {output_file}...")
     
     # 获取所有失败表达式（不限制数量）
-    failed_expressions = db.get_failed_expressions(limit=10000, **filters)
+    failed_expressions = db.get_failed_expressions_raw(limit=10000, **filters)
     
     if not failed_expressions:
         print("❌ 没有找到失败表达式记录")
         return
     
     # 转换为DataFrame并解析错误消息
-    df = pd.DataFrame(failed_expressions)
+    df = pd.DataFrame(failed_expressions, columns=FAILED_EXPRESSION_COLUMNS)
     
     # 解析error_details中的message
     def extract_error_message(error_details):
@@ -28,6 +28,10 @@ if [ -f "$DB_PATH" ]; then
     if python "$TEST_SCRIPT" > /dev/null 2>&1; then
         echo -e "${GREEN}✅ 数据库验证通过${NC}"
         
+        # 已有数据库按版本执行尚未完成的结构升级（新建的数据库已是最新结构）
+        echo -e "${BLUE}🔄 检查数据库结构版本...${NC}"
+        python /app/database/upgrade_schema.py || echo -e "${YELLOW}⚠️  结构升级失败，继续使用现有结构${NC}"
+        
         # 检查是否需要增量迁移
         echo -e "${BLUE}🔄 检查是否有新数据需要迁移...${NC}"
         NEED_MIGRATION=false
@@ -121,6 +125,9 @@ if os.path.exists(schema_path):
     
     conn = sqlite3.connect(db_path)
     conn.executescript(schema_sql)
+    # 每日提交统计表的定义在 daily_submit_stats.sql 中，紧随 schema.sql 执行
+    with open('/app/database/daily_submit_stats.sql', 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
     conn.close()
     print('✅ 空数据库结构创建成功')
 else:
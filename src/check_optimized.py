@@ -213,114 +213,115 @@ class OptimizedChecker:
         if submitable_alphas:
             self.logger.info(f"    📊 准备更新可提交Alpha数据库...")
             
-            # 过滤已存在的因子，避免重复插入
-            new_submitable_alphas = []
-            skipped_existing = 0
-            
-            for alpha in submitable_alphas:
-                alpha_id = alpha['id']
-                if db.is_alpha_submitable(alpha_id):
-                    skipped_existing += 1
-                    self.logger.info(f"    ⏭️  Alpha {alpha_id}: 已存在于可提交数据库中，跳过插入")
-                else:
-                    new_submitable_alphas.append(alpha)
-            
-            self.logger.info(f"    📊 重复检查结果: {len(submitable_alphas)} 个检查通过，{skipped_existing} 个已存在，{len(new_submitable_alphas)} 个需要插入")
+            # 已存在的因子由数据库主键约束跳过（ON CONFLICT DO NOTHING），无需逐个预先查询
+            inserted_ids = []
+            save_failed = False
             
             # 使用数据库事务保证数据一致性
             try:
-                if new_submitable_alphas:
-                    # 转换为DataFrame格式
-                    submitable_df = pd.DataFrame(new_submitable_alphas)
+                # 转换为DataFrame格式
+                submitable_df = pd.DataFrame(submitable_alphas)
+                
+                # 整理为数据库字段后一次性批量插入
+                rows = []
+                for _, row in submitable_df.iterrows():
+                    alpha_data = row.to_dict()
                     
-                    # 批量添加到数据库
-                    success_count = 0
-                    for _, row in submitable_df.iterrows():
-                        alpha_data = row.to_dict()
-                        
-                        # 字段名映射：API驼峰命名 -> 数据库下划线命名
-                        field_mapping = {
-                            'id': 'alpha_id',
-                            'instrumentType': 'instrument_type',
-                            'unitHandling': 'unit_handling', 
-                            'nanHandling': 'nan_handling',
-                            'operatorCount': 'operator_count',
-                            'dateCreated': 'date_created',
-                            'dateSubmitted': 'date_submitted', 
-                            'dateModified': 'date_modified',
-                            'bookSize': 'book_size',
-                            'longCount': 'long_count',
-                            'shortCount': 'short_count',
-                            'startDate': 'start_date'
-                        }
-                        
-                        # 应用字段名映射
-                        for old_name, new_name in field_mapping.items():
-                            if old_name in alpha_data:
-                                alpha_data[new_name] = alpha_data.pop(old_name)
-                        
-                        # 只保留核心字段，避免存储过多复杂数据
-                        core_fields = {
-                            'alpha_id', 'type', 'author', 'instrument_type', 'region', 'universe',
-                            'delay', 'decay', 'neutralization', 'truncation', 'pasteurization',
-                            'unit_handling', 'nan_handling', 'language', 'visualization', 'code',
-                            'description', 'operator_count', 'date_created', 'date_submitted',
-                            'date_modified', 'name', 'favorite', 'hidden', 'color', 'category',
-                            'tags', 'grade', 'stage', 'status', 'pnl', 'book_size', 'long_count',
-                            'short_count', 'turnover', 'returns', 'drawdown', 'margin', 'fitness',
-                            'sharpe', 'start_date', 'aggressive_mode', 'self_corr', 'prod_corr'
-                        }
-                        
-                        # 过滤字段
-                        filtered_data = {}
-                        for key, value in alpha_data.items():
-                            if key in core_fields:
-                                filtered_data[key] = value
-                        
-                        # 数据类型转换：复杂对象转换为JSON字符串
-                        complex_fields = ['tags']  # 只处理tags字段，其他复杂字段已过滤掉
-                        for field in complex_fields:
-                            if field in filtered_data and filtered_data[field] is not None:
-                                if isinstance(filtered_data[field], (list, dict)):
-                                    filtered_data[field] = json.dumps(filtered_data[field], ensure_ascii=False)
-                                elif not isinstance(filtered_data[field], str):
-                                    filtered_data[field] = str(filtered_data[field])
-                        
-                        # 处理None值和布尔值
-                        for key in list(filtered_data.keys()):
-                            if filtered_data[key] is None:
-                                filtered_data[key] = ''
-                            elif isinstance(filtered_data[key], bool):
-                                filtered_data[key] = 1 if filtered_data[key] else 0
-                            elif isinstance(filtered_data[key], (int, float)):
-                                filtered_data[key] = filtered_data[key]
-                            else:
-                                filtered_data[key] = str(filtered_data[key])
-                        
-                        if db.add_submitable_alpha(filtered_data):
-                            success_count += 1
+                    # 字段名映射：API驼峰命名 -> 数据库下划线命名
+                    field_mapping = {
+                        'id': 'alpha_id',
+                        'instrumentType': 'instrument_type',
+                        'unitHandling': 'unit_handling', 
+                        'nanHandling': 'nan_handling',
+                        'operatorCount': 'operator_count',
+                        'dateCreated': 'date_created',
+                        'dateSubmitted': 'date_submitted', 
+                        'dateModified': 'date_modified',
+                        'bookSize': 'book_size',
+                        'longCount': 'long_count',
+                        'shortCount': 'short_count',
+                        'startDate': 'start_date'
+                    }
                     
-                    if success_count == len(new_submitable_alphas):
-                        self.logger.info(f"    📊 数据库更新成功: 添加了 {success_count} 个新的可提交Alpha")
-                        
-                        # 获取当前数据库中的总数
-                        current_df = db.get_submitable_alphas()
-                        total_count = len(current_df)
-                        self.logger.info(f"    📊 数据库中当前共有 {total_count} 个可提交Alpha")
-                    else:
-                        self.logger.info(f"    ⚠️  部分数据库更新失败: 成功 {success_count}/{len(new_submitable_alphas)}")
+                    # 应用字段名映射
+                    for old_name, new_name in field_mapping.items():
+                        if old_name in alpha_data:
+                            alpha_data[new_name] = alpha_data.pop(old_name)
+                    
+                    # 只保留核心字段，避免存储过多复杂数据
+                    core_fields = {
+                        'alpha_id', 'type', 'author', 'instrument_type', 'region', 'universe',
+                        'delay', 'decay', 'neutralization', 'truncation', 'pasteurization',
+                        'unit_handling', 'nan_handling', 'language', 'visualization', 'code',
+                        'description', 'operator_count', 'date_created', 'date_submitted',
+                        'date_modified', 'name', 'favorite', 'hidden', 'color', 'category',
+                        'tags', 'grade', 'stage', 'status', 'pnl', 'book_size', 'long_count',
+                        'short_count', 'turnover', 'returns', 'drawdown', 'margin', 'fitness',
+                        'sharpe', 'start_date', 'aggressive_mode', 'self_corr', 'prod_corr'
+                    }
+                    
+                    # 过滤字段
+                    filtered_data = {}
+                    for key, value in alpha_data.items():
+                        if key in core_fields:
+                            filtered_data[key] = value
+                    
+                    # 数据类型转换：复杂对象转换为JSON字符串
+                    complex_fields = ['tags']  # 只处理tags字段，其他复杂字段已过滤掉
+                    for field in complex_fields:
+                        if field in filtered_data and filtered_data[field] is not None:
+                            if isinstance(filtered_data[field], (list, dict)):
+                                filtered_data[field] = json.dumps(filtered_data[field], ensure_ascii=False)
+                            elif not isinstance(filtered_data[field], str):
+                                filtered_data[field] = str(filtered_data[field])
+                    
+                    # 处理None值和布尔值
+                    for key in list(filtered_data.keys()):
+                        if filtered_data[key] is None:
+                            filtered_data[key] = ''
+                        elif isinstance(filtered_data[key], bool):
+                            filtered_data[key] = 1 if filtered_data[key] else 0
+                        elif isinstance(filtered_data[key], (int, float)):
+                            filtered_data[key] = filtered_data[key]
+                        else:
+                            filtered_data[key] = str(filtered_data[key])
+                    
+                    rows.append(filtered_data)
+                
+                new_ids = db.insert_new_submitable_alphas(rows)
+                if new_ids is None:
+                    # 返回None表示插入失败（已回滚），不能当作“全部已存在”处理
+                    raise RuntimeError(f"批量插入 {len(rows)} 个可提交Alpha失败，本批次已回滚")
+                inserted_ids = new_ids
+                
+                inserted_set = set(inserted_ids)
+                for alpha in submitable_alphas:
+                    if alpha['id'] not in inserted_set:
+                        self.logger.info(f"    ⏭️  Alpha {alpha['id']}: 已存在于可提交数据库中，跳过插入")
+                
+                self.logger.info(f"    📊 重复检查结果: {len(submitable_alphas)} 个检查通过，{len(submitable_alphas) - len(inserted_ids)} 个已存在，{len(inserted_ids)} 个新插入")
+                
+                if inserted_ids:
+                    self.logger.info(f"    📊 数据库更新成功: 添加了 {len(inserted_ids)} 个新的可提交Alpha")
+                    
+                    # 获取当前数据库中的总数
+                    current_df = db.get_submitable_alphas()
+                    total_count = len(current_df)
+                    self.logger.info(f"    📊 数据库中当前共有 {total_count} 个可提交Alpha")
                 else:
                     self.logger.info(f"    📝 所有因子都已存在于数据库中，无需插入新数据")
-                    
+                
             except Exception as e:
+                save_failed = True
                 self.logger.info(f"    ❌ 数据库操作异常: {e}")
                 self.logger.info(f"    🔄 跳过本批次可提交Alpha保存，等待下轮重试")
             
             # 批量设置Alpha为YELLOW（包括新插入的和已存在的因子）
             # 对于已存在的因子，也需要标记为YELLOW，因为可能之前标记失败了
             yellow_ids = [alpha['id'] for alpha in submitable_alphas]  # 所有通过检查的因子
+            skipped_existing = 0 if save_failed else len(submitable_alphas) - len(inserted_ids)
             if skipped_existing > 0:
-                self.logger.info(f"    🎨 设置 {len(yellow_ids)} 个Alpha为YELLOW (包括 {len(new_submitable_alphas)} 个新插入的和 {skipped_existing} 个已存在的)...")
+                self.logger.info(f"    🎨 设置 {len(yellow_ids)} 个Alpha为YELLOW (包括 {len(inserted_ids)} 个新插入的和 {skipped_existing} 个已存在的)...")
             else:
                 self.logger.info(f"    🎨 设置 {len(yellow_ids)} 个Alpha为YELLOW...")
             self.batch_set_alpha_properties(yellow_ids, color='YELLOW')